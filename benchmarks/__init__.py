@@ -0,0 +1,24 @@
+"""Offline benchmark suite for the calculator services.
+
+Run from the repository root:
+
+    python -m benchmarks micro
+    python -m benchmarks macro --baseline benchmarks/baseline.json
+
+Micro benchmarks time the pieces of a service's request path in-process.
+Macro benchmarks start the four services and the GUI locally, with a fake
+Redis server, and drive them over HTTP with the simulator's load engine.
+"""
+import operator
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Service directory -> (port, GUI operation, operator)
+SERVICES = {
+    'addition': (5001, 'add', operator.add),
+    'subtraction': (5002, 'subtract', operator.sub),
+    'multiplication': (5003, 'multiply', operator.mul),
+    'division': (5004, 'divide', operator.truediv)
+}
+GUI_PORT = 5000
@@ -0,0 +1,60 @@
+import argparse
+import shutil
+import sys
+
+from benchmarks import baseline
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Calculator benchmark suite')
+    parser.add_argument('suite', nargs='?', default='all', choices=['micro', 'macro', 'all'])
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to write this run')
+    parser.add_argument('--baseline', help='Earlier results to compare against')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Percent a metric may get worse before it is flagged')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Copy this run over --baseline after comparing')
+    parser.add_argument('--repeat', type=int, default=15, help='Micro: timing repeats per benchmark')
+    parser.add_argument('--requests', type=int, default=5000, help='Macro: requests in the throughput run')
+    parser.add_argument('--concurrency', type=int, default=32, help='Macro: concurrent connections')
+    parser.add_argument('--rate', type=float, default=200, help='Macro: req/s of the latency run')
+    parser.add_argument('--duration', type=float, default=10, help='Macro: seconds of the latency run')
+    parser.add_argument('--workers', type=int, default=1, help='Macro: gunicorn workers per service')
+    parser.add_argument('--gui-mode', default='sync', choices=['sync', 'async'], help='Macro: GUI server')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = {}
+    if args.suite in ('micro', 'all'):
+        from benchmarks.micro import run_micro
+        print("Micro benchmarks")
+        results.update(run_micro(repeat=args.repeat))
+    if args.suite in ('macro', 'all'):
+        from benchmarks.macro import run_macro
+        print("Macro benchmark")
+        results.update(run_macro(requests=args.requests, concurrency=args.concurrency, rate=args.rate,
+                                 duration=args.duration, workers=args.workers, gui_mode=args.gui_mode))
+
+    report = baseline.save(args.output, results)
+    print(f"\nResults saved to {args.output}")
+
+    regressed = False
+    if args.baseline:
+        try:
+            previous = baseline.load(args.baseline)
+        except FileNotFoundError:
+            print(f"No baseline at {args.baseline} yet")
+        else:
+            rows = baseline.compare(previous, report, args.threshold)
+            baseline.print_comparison(rows, args.threshold)
+            regressed = any(row[-1] for row in rows)
+        if args.update_baseline:
+            shutil.copyfile(args.output, args.baseline)
+            print(f"Baseline {args.baseline} updated")
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
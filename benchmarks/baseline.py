@@ -0,0 +1,70 @@
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+
+from benchmarks import ROOT
+
+# Compared metrics and which direction is better
+METRICS = {
+    'min_ns_per_op': 'lower',
+    'throughput_rps': 'higher',
+    'p50_ms': 'lower',
+    'p99_ms': 'lower'
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(path, benchmarks):
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': f'{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)',
+        'benchmarks': benchmarks
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=10.0):
+    """Compare two reports; returns (name, metric, old, new, change %, regressed) rows.
+
+    ``change`` is positive when the metric got worse. Benchmarks or metrics
+    missing from either report are skipped.
+    """
+    rows = []
+    for name, result in current['benchmarks'].items():
+        old_result = baseline['benchmarks'].get(name)
+        if not old_result:
+            continue
+        for metric, better in METRICS.items():
+            old, new = old_result.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            if better == 'higher':
+                change = -change
+            rows.append((name, metric, old, new, change, change > threshold))
+    return rows
+
+
+def print_comparison(rows, threshold):
+    print(f"\n=== Comparison with baseline (regression threshold {threshold:g}%) ===")
+    for name, metric, old, new, change, regressed in rows:
+        flag = 'REGRESSION' if regressed else ('improved' if change < -threshold else 'ok')
+        print(f"  {name:<44} {metric:<15} {old:12.2f} -> {new:12.2f}  {change:+7.1f}%  {flag}")
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import fakeredis
+import redis
+
+from benchmarks import GUI_PORT, ROOT, SERVICES
+
+# The load engine and its stats live in the simulator, which uses flat imports
+sys.path.insert(0, os.path.join(ROOT, 'simulation'))
+
+from engine import LoadEngine, make_arrivals  # noqa: E402
+from stats import RunStats  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def port_in_use(port):
+    with socket.socket() as s:
+        return s.connect_ex(('127.0.0.1', port)) == 0
+
+
+def wait_ready(url, process, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{url} exited with code {process.returncode} before becoming ready')
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'{url} not ready after {timeout:.0f}s')
+
+
+class Stack:
+    """The four operation services and the GUI as local processes, on a fake Redis server"""
+
+    def __init__(self, workers=1, gui_mode='sync'):
+        self.workers = workers
+        self.gui_mode = gui_mode
+        self.processes = []
+        self.redis_server = None
+
+    def start(self):
+        busy = [port for port in [GUI_PORT] + [p for p, _, _ in SERVICES.values()] if port_in_use(port)]
+        if busy:
+            raise RuntimeError(f"Ports already in use: {', '.join(map(str, busy))}")
+
+        redis_port = free_port()
+        self.redis_server = fakeredis.TcpFakeServer(('127.0.0.1', redis_port), server_type='redis')
+        threading.Thread(target=self.redis_server.serve_forever, daemon=True).start()
+        self.redis_port = redis_port
+
+        env = dict(os.environ, REDIS_HOST='127.0.0.1', REDIS_PORT=str(redis_port),
+                   WEB_WORKERS=str(self.workers), WEB_ACCESS_LOG='', GUI_MODE=self.gui_mode)
+        env.pop('SERVER', None)
+        for name, (port, _, _) in SERVICES.items():
+            env[f'{name.upper()}_SERVICE'] = f'http://127.0.0.1:{port}'
+
+        for name, (port, _, _) in SERVICES.items():
+            self.spawn(name, env, f'http://127.0.0.1:{port}/health')
+        self.spawn('gui', env, f'http://127.0.0.1:{GUI_PORT}/')
+
+    def spawn(self, name, env, ready_url):
+        # Separate multiprocess metric directories, as in the containers
+        env = dict(env, PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(prefix=f'bench-{name}-'))
+        process = subprocess.Popen([sys.executable, 'app.py'], cwd=os.path.join(ROOT, name), env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.processes.append(process)
+        wait_ready(ready_url, process)
+
+    def tracked_operations(self):
+        """Sum of the operations:* counters the services wrote to the fake Redis"""
+        client = redis.Redis(host='127.0.0.1', port=self.redis_port, decode_responses=True)
+        keys = [f'operations:{name}' for name in SERVICES]
+        return sum(int(value or 0) for value in client.mget(keys))
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if self.redis_server:
+            self.redis_server.shutdown()
+            self.redis_server.server_close()
+
+
+def summarize(stats, elapsed):
+    return {
+        'requests': stats.total_requests,
+        'errors': stats.failed_requests,
+        'throughput_rps': stats.successful_requests / elapsed if elapsed else 0.0,
+        'p50_ms': stats.latency.value_at_percentile(50) * 1000,
+        'p99_ms': stats.latency.value_at_percentile(99) * 1000,
+        'p999_ms': stats.latency.value_at_percentile(99.9) * 1000
+    }
+
+
+def drive(load, connections):
+    stats = RunStats()
+    engine = LoadEngine(f'http://127.0.0.1:{GUI_PORT}', stats.record, connections=connections)
+    start = time.perf_counter()
+    asyncio.run(load(engine))
+    return stats, time.perf_counter() - start
+
+
+def run_macro(requests=5000, concurrency=32, rate=200, duration=10, workers=1, gui_mode='sync'):
+    """End-to-end throughput (closed loop, no think time) and latency at a fixed rate (open loop)"""
+    stack = Stack(workers=workers, gui_mode=gui_mode)
+    results = {}
+    try:
+        stack.start()
+        # Warm up connection pools and imports before measuring
+        warmup, _ = drive(lambda engine: engine.closed_loop(concurrency, 10, think_time=(0, 0)), concurrency)
+        successful = warmup.successful_requests
+
+        per_user = max(1, requests // concurrency)
+        stats, elapsed = drive(
+            lambda engine: engine.closed_loop(concurrency, per_user, think_time=(0, 0)), concurrency)
+        results['macro/throughput'] = summarize(stats, elapsed)
+        successful += stats.successful_requests
+        print(f"  throughput: {results['macro/throughput']['throughput_rps']:.0f} req/s, "
+              f"p99 {results['macro/throughput']['p99_ms']:.2f}ms, errors {stats.failed_requests}")
+
+        stats, elapsed = drive(
+            lambda engine: engine.open_loop(make_arrivals('constant', rate, duration)), concurrency)
+        results['macro/latency'] = summarize(stats, elapsed)
+        successful += stats.successful_requests
+        print(f"  latency at {rate:g} req/s: p50 {results['macro/latency']['p50_ms']:.2f}ms, "
+              f"p99 {results['macro/latency']['p99_ms']:.2f}ms, errors {stats.failed_requests}")
+
+        # Let the trackers flush (TRACKING_FLUSH_INTERVAL), then check every successful request reached Redis
+        time.sleep(1.0)
+        results['macro/tracking'] = {'successful_requests': successful,
+                                     'tracked_operations': stack.tracked_operations()}
+        print(f"  tracked {results['macro/tracking']['tracked_operations']} of {successful} operations")
+    finally:
+        stack.stop()
+    return results
@@ -0,0 +1,147 @@
+import gc
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+import fakeredis
+from prometheus_client import CollectorRegistry, Counter, Histogram
+
+from benchmarks import ROOT, SERVICES
+from calculator_core.service import json_response, parse_operands
+
+BODY = json.dumps({'num1': 12.5, 'num2': 3.25})
+BATCH_BODY = json.dumps({'num1': [float(i) for i in range(1, 101)],
+                         'num2': [float(i) for i in range(1, 101)]})
+
+
+def calibrate(func, min_time=0.1):
+    """Loop count that makes one timed loop of ``func()`` last at least ``min_time``, as timeit picks it"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return number
+        number *= 10 if elapsed < min_time / 10 else 2
+
+
+def time_loop(func, number):
+    """Seconds per call over ``number`` calls, with the garbage collector off as in timeit"""
+    gc.collect()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return (time.perf_counter() - start) / number
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def measure_all(benchmarks, repeat=15, min_time=0.1, between=None):
+    """Time every benchmark ``repeat`` times, in interleaved rounds.
+
+    Each round runs one timed loop of every benchmark, so a few seconds of
+    noise on the machine slow down one sample of each benchmark instead of
+    every sample of one; ``min_ns_per_op``, which the baseline comparison
+    uses, then skips them. ``between`` is called before every timed loop,
+    outside the measurement.
+    """
+    numbers = {}
+    for name, func in benchmarks.items():
+        if between:
+            between()
+        numbers[name] = calibrate(func, min_time)
+
+    per_call = {name: [] for name in benchmarks}
+    for _ in range(repeat):
+        for name, func in benchmarks.items():
+            if between:
+                between()
+            per_call[name].append(time_loop(func, numbers[name]))
+
+    results = {}
+    for name, samples in per_call.items():
+        median = statistics.median(samples)
+        results[name] = {
+            'ns_per_op': median * 1e9,
+            'min_ns_per_op': min(samples) * 1e9,
+            'ops_per_sec': 1 / median,
+            'loops': numbers[name],
+            'repeat': repeat
+        }
+    return results
+
+
+def load_service(name):
+    """Import ``<name>/app.py`` and point its tracker at an in-memory fake Redis"""
+    spec = importlib.util.spec_from_file_location(f'{name}_app', os.path.join(ROOT, name, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    tracker = module.app.tracker
+    tracker.client = fakeredis.FakeRedis(decode_responses=True)
+    # The background flush would compete with the code being timed; run_micro
+    # flushes between timed loops instead
+    tracker.flush_interval = threading.TIMEOUT_MAX
+    tracker.flush_count = tracker.batch_size = sys.maxsize
+    return module.app
+
+
+def hot_path_benchmarks(app, name, func):
+    """The steps of one /calculate request, timed one by one"""
+    data = json.loads(BODY)
+    num1, num2 = parse_operands(data)
+    registry = CollectorRegistry()
+    counter = Counter('bench_requests_total', 'Benchmark counter', registry=registry)
+    histogram = Histogram('bench_latency_seconds', 'Benchmark histogram', registry=registry)
+
+    def observe():
+        counter.inc()
+        histogram.observe(0.001)
+
+    def track():
+        app.tracker.track(name, record=(num1, num2, 1.0, time.time()))
+
+    return {
+        'json_parse': lambda: json.loads(BODY),
+        'float_conversion': lambda: parse_operands(data),
+        'operator': lambda: func(num1, num2),
+        'json_response': lambda: json_response({'result': func(num1, num2), 'operation': name}),
+        'metrics_observe': observe,
+        'track_operation': track
+    }
+
+
+def run_micro(services=None, repeat=15, min_time=0.1):
+    apps = []
+    benchmarks = {}
+    for name in services or SERVICES:
+        _, _, func = SERVICES[name]
+        app = load_service(name)
+        client = app.test_client()
+        if not apps:
+            # The shared steps are identical in every service, time them once
+            benchmarks.update(hot_path_benchmarks(app, name, func))
+        apps.append(app)
+        benchmarks[f'{name}/calculate'] = lambda client=client: client.post(
+            '/calculate', data=BODY, content_type='application/json')
+        benchmarks[f'{name}/calculate_batch_100'] = lambda client=client: client.post(
+            '/calculate/batch', data=BATCH_BODY, content_type='application/json')
+
+    def flush():
+        for app in apps:
+            app.tracker.flush()
+
+    results = {}
+    for bench, result in measure_all(benchmarks, repeat=repeat, min_time=min_time, between=flush).items():
+        results[f'micro/{bench}'] = result
+        print(f"  {bench:<36} {result['ns_per_op'] / 1000:10.2f} us/op")
+    return results
@@ -0,0 +1,6 @@
+"""Shared core of the calculator operation services"""
+from .service import create_service_app, json_response
+from .tracking import OperationTracker, read_recent_operations, redis_from_env, tracker_from_env
+
+__all__ = ['create_service_app', 'json_response', 'OperationTracker', 'read_recent_operations', 'redis_from_env',
+           'tracker_from_env']
@@ -0,0 +1,186 @@
+import atexit
+import json
+import math
+import os
+import time
+
+import numpy as np
+from flask import Flask, Response, request
+from prometheus_client import REGISTRY, Counter, Histogram
+from serving import metrics_response
+from serving.tracing import tracer_from_env
+
+from .instrumentation import current_trace, instrument, latency_buckets
+from .tracking import tracker_from_env
+
+# Largest number of operand pairs accepted by /calculate/batch
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 10000))
+
+# Error of a result that overflows to infinity, e.g. 1e308 * 10, which has no JSON representation
+OUT_OF_RANGE = 'Result is out of range'
+
+
+class InvalidInput(Exception):
+    def __init__(self, message='Invalid input', status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def json_response(payload, status=200):
+    """Compact JSON response; the single serialization path of every service"""
+    return Response(json.dumps(payload, separators=(',', ':')), status=status,
+                    mimetype='application/json')
+
+
+def parse_body():
+    try:
+        data = json.loads(request.get_data())
+    except ValueError:
+        raise InvalidInput()
+    if not isinstance(data, dict):
+        raise InvalidInput()
+    return data
+
+
+def parse_operands(data):
+    """Parse the num1/num2 of a /calculate request into finite floats"""
+    try:
+        num1, num2 = float(data['num1']), float(data['num2'])
+    except (ValueError, KeyError, TypeError):
+        raise InvalidInput()
+    # NaN and infinity have no JSON representation
+    if not (math.isfinite(num1) and math.isfinite(num2)):
+        raise InvalidInput()
+    return num1, num2
+
+
+def parse_operand_arrays(data):
+    """Parse num1/num2 operand arrays of a batch request into float64 vectors"""
+    try:
+        num1 = np.asarray(data['num1'], dtype=np.float64)
+        num2 = np.asarray(data['num2'], dtype=np.float64)
+    except (ValueError, KeyError, TypeError):
+        raise InvalidInput()
+    if num1.ndim != 1 or num1.shape != num2.shape:
+        raise InvalidInput()
+    # null becomes NaN in the conversion, and neither NaN nor infinity is valid JSON
+    if not (np.isfinite(num1).all() and np.isfinite(num2).all()):
+        raise InvalidInput()
+    if num1.size > BATCH_MAX_SIZE:
+        raise InvalidInput(f'Batch size exceeds {BATCH_MAX_SIZE}', 413)
+    return num1, num2
+
+
+def create_service_app(name, operator, rules=(), registry=REGISTRY, redis_client=None):
+    """Build the Flask app of one operation service.
+
+    ``operator`` takes (num1, num2) and must work on floats as well as on
+    NumPy arrays, e.g. ``operator.add``. ``rules`` is a sequence of
+    ``(check, message)`` pairs: ``check(num1, num2)`` is true for valid
+    operands, elementwise on arrays, and ``message`` is returned otherwise.
+    """
+    app = Flask(__name__)
+    instrument(app, name, registry, tracer_from_env(name))
+
+    # Metrics
+    request_count = Counter(f'{name}_requests_total', f'Total {name} requests', registry=registry)
+    request_latency = Histogram(f'{name}_request_latency_seconds', f'{name.capitalize()} request latency',
+                                buckets=latency_buckets(), registry=registry)
+    error_count = Counter(f'{name}_errors_total', f'Total {name} errors', registry=registry)
+
+    tracker = tracker_from_env(name, redis_client, registry=registry)
+    atexit.register(tracker.flush)
+    app.tracker = tracker
+
+    @app.errorhandler(InvalidInput)
+    def invalid_input(e):
+        error_count.inc()
+        return json_response({'error': e.message}, e.status)
+
+    @app.route('/calculate', methods=['POST'])
+    def calculate():
+        start_time = time.perf_counter()
+        request_count.inc()
+        trace = current_trace()
+
+        with trace.span('parse'):
+            num1, num2 = parse_operands(parse_body())
+        with trace.span('compute'):
+            for check, message in rules:
+                if not check(num1, num2):
+                    raise InvalidInput(message)
+            result = operator(num1, num2)
+            if not math.isfinite(result):
+                raise InvalidInput(OUT_OF_RANGE)
+
+        # Record latency
+        request_latency.observe(time.perf_counter() - start_time)
+
+        # Track operation
+        with trace.span('track_operation'):
+            tracker.track(name, record=(num1, num2, result, time.time()))
+
+        with trace.span('respond'):
+            return json_response({'result': result, 'operation': name})
+
+    @app.route('/calculate/batch', methods=['POST'])
+    def calculate_batch():
+        start_time = time.perf_counter()
+        request_count.inc()
+        trace = current_trace()
+
+        with trace.span('parse'):
+            num1, num2 = parse_operand_arrays(parse_body())
+        with trace.span('compute'):
+            valid = np.ones(num1.shape, dtype=bool)
+            for check, _ in rules:
+                valid &= check(num1, num2)
+            with np.errstate(all='ignore'):
+                values = operator(num1, num2)
+            ok = valid & np.isfinite(values)
+
+            errors = []
+            if ok.all():
+                results = values.tolist()
+            else:
+                # Invalid elements are rejected one by one, the rest of the batch still succeeds
+                results = [value if good else None for good, value in zip(ok.tolist(), values.tolist())]
+                for index in np.flatnonzero(~ok).tolist():
+                    if valid[index]:
+                        message = OUT_OF_RANGE
+                    else:
+                        message = next(message for check, message in rules
+                                       if not check(num1[index], num2[index]))
+                    errors.append({'index': index, 'error': message})
+
+        # Record latency
+        request_latency.observe(time.perf_counter() - start_time)
+
+        # Track operations
+        tracked = len(results) - len(errors)
+        if tracked:
+            with trace.span('track_operation'):
+                tracker.track(name, tracked)
+
+        with trace.span('respond'):
+            response = {'results': results, 'operation': name}
+            if errors:
+                response['errors'] = errors
+            return json_response(response)
+
+    @app.route('/health', methods=['GET'])
+    def health():
+        return json_response({'status': 'healthy', 'service': name})
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        body, content_type = metrics_response(registry, request.headers.get('Accept'))
+        return body, 200, {'Content-Type': content_type}
+
+    @app.route('/operations/count', methods=['GET'])
+    def get_operation_count():
+        """Get count of operations for this service: the Redis total plus what is not flushed yet"""
+        return json_response({'operation': name, 'count': tracker.total(name)})
+
+    return app
@@ -0,0 +1,319 @@
+import logging
+import os
+import random
+import struct
+import threading
+import time
+from collections import deque
+
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+from prometheus_client import REGISTRY, Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# A recent operation as stored in its stream: num1, num2, result, timestamp
+RECENT_RECORD = struct.Struct('<dddd')
+
+
+def recent_stream_key(service):
+    """Capped Redis Stream of the recent operations of one service"""
+    return f'recent_operations:{service}'
+
+
+def redis_from_env(decode_responses=True):
+    """Redis client for operation tracking, configured from REDIS_HOST / REDIS_PORT / REDIS_TIMEOUT"""
+    timeout = float(os.getenv('REDIS_TIMEOUT', 0.5))
+    return redis.Redis(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        decode_responses=decode_responses,
+        socket_connect_timeout=timeout,
+        socket_timeout=timeout,
+        # Fail fast, the tracker's circuit breaker decides when to retry
+        retry=Retry(NoBackoff(), 0)
+    )
+
+
+class _Shard:
+    """Cumulative counts of one request thread.
+
+    Only the owning thread writes ``counts``; the flusher reads a copy and
+    remembers in ``flushed`` what already reached Redis, so neither side
+    needs a lock. Once the owner has exited the flusher folds the shard into
+    the tracker's base shard (``owner`` None), so servers that start a thread
+    per request keep as many shards as live threads.
+    """
+    __slots__ = ('owner', 'counts', 'flushed')
+
+    def __init__(self, owner=None):
+        self.owner = owner
+        self.counts = {}
+        self.flushed = {}
+
+
+class OperationTracker:
+    """Aggregate operation counts in memory and write them to Redis in the background.
+
+    The request path only bumps a counter in its thread's own shard. A worker
+    thread adds up what every shard gained since the last flush and sends it
+    with one INCRBY per operation, every ``flush_interval`` seconds or as soon
+    as ``flush_count`` operations are waiting. Counts that could not be
+    written stay pending and go out with the next successful flush, so a Redis
+    outage delays the totals instead of losing them. After repeated Redis
+    failures the circuit opens and no write is attempted until
+    ``reset_timeout`` has passed.
+
+    A ``recent_sample_rate`` share of the operation records is queued in a
+    bounded deque, whose oldest record is dropped and counted when it is
+    full, and appended to the service's own stream (``recent_stream_key``),
+    capped at about ``recent_maxlen`` entries; 0 disables the stream.
+    """
+
+    def __init__(self, service, client, max_queue=10000, batch_size=500, flush_interval=0.25,
+                 flush_count=1000, failure_threshold=3, reset_timeout=10.0, recent_maxlen=1000,
+                 recent_sample_rate=1.0, registry=REGISTRY):
+        self.service = service
+        self.client = client
+        self.recent_key = recent_stream_key(service)
+        self.recent_maxlen = recent_maxlen
+        self.recent_sample_rate = recent_sample_rate if recent_maxlen else 0.0
+        self.records = deque(maxlen=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flush_count = flush_count
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.local = threading.local()
+        self.shards = [_Shard()]
+        # Operations since the last flush; only a trigger, so unsynchronized updates are fine
+        self.unflushed = 0
+        self.failures = 0
+        self.open_until = 0.0
+        self.thread = None
+        self.pid = None
+
+        self.dropped = Counter(f'{service}_tracking_dropped_total', 'Operation records dropped',
+                               ['reason'], registry=registry)
+        self.queue_size = Gauge(f'{service}_tracking_queue_size',
+                                'Operation records waiting for Redis',
+                                multiprocess_mode='livesum', registry=registry)
+        self.circuit_open = Gauge(f'{service}_tracking_circuit_open',
+                                  '1 while Redis tracking is paused after failures',
+                                  multiprocess_mode='livemax', registry=registry)
+
+    def available(self):
+        """False while the circuit is open after repeated Redis failures"""
+        return not self.open_until or time.monotonic() >= self.open_until
+
+    def track(self, operation, count=1, record=None):
+        """Count ``count`` operations; ``record`` is an optional (num1, num2, result, timestamp)"""
+        self._ensure_worker()
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self._add_shard()
+        shard.counts[operation] = shard.counts.get(operation, 0) + count
+        self.unflushed += count
+        if self.unflushed >= self.flush_count:
+            self.wakeup.set()
+
+        if record is None or (self.recent_sample_rate < 1.0 and random.random() >= self.recent_sample_rate):
+            return
+        if not self.available():
+            self.dropped.labels(reason='circuit_open').inc()
+            return
+        with self.lock:
+            if len(self.records) == self.records.maxlen:
+                self.dropped.labels(reason='queue_full').inc()
+            self.records.append(record)
+            if len(self.records) >= self.batch_size:
+                self.wakeup.set()
+
+    def _add_shard(self):
+        shard = _Shard(threading.current_thread())
+        with self.lock:
+            self.shards.append(shard)
+        self.local.shard = shard
+        return shard
+
+    def pending(self, operation):
+        """Operations counted in this process but not yet written to Redis"""
+        # Under the lock so a shard being folded is not counted twice
+        with self.lock:
+            return sum(shard.counts.get(operation, 0) - shard.flushed.get(operation, 0)
+                       for shard in self.shards)
+
+    def total(self, operation):
+        """Redis total plus this process's pending count; only the latter while Redis is unavailable"""
+        # Holding the flush lock keeps a write in flight from being counted twice
+        with self.flush_lock:
+            pending = self.pending(operation)
+            if not self.available():
+                return pending
+            try:
+                return int(self.client.get(f'operations:{operation}') or 0) + pending
+            except redis.exceptions.RedisError:
+                return pending
+
+    def _ensure_worker(self):
+        # Restart the worker in forked child processes, threads do not survive fork
+        if self.pid != os.getpid() or self.thread is None:
+            with self.lock:
+                if self.pid != os.getpid() or self.thread is None:
+                    if self.pid is not None:
+                        # Counts of the parent were (or will be) flushed by the parent
+                        self.local = threading.local()
+                        self.shards = [_Shard()]
+                        self.unflushed = 0
+                    self.pid = os.getpid()
+                    self.thread = threading.Thread(target=self._run, daemon=True)
+                    self.thread.start()
+
+    def _take_counts(self):
+        """Increase of every operation since the last flush, and the shard states it covers"""
+        with self.lock:
+            self._fold_dead_shards()
+            shards = list(self.shards)
+        self.unflushed = 0
+        counts = {}
+        states = []
+        for shard in shards:
+            current = shard.counts.copy()
+            for operation, value in current.items():
+                delta = value - shard.flushed.get(operation, 0)
+                if delta:
+                    counts[operation] = counts.get(operation, 0) + delta
+            states.append((shard, current))
+        return counts, states
+
+    def _fold_dead_shards(self):
+        # Called by the flusher with the lock held; the counts of an exited thread can no longer change
+        base = self.shards[0]
+        live = [base]
+        for shard in self.shards[1:]:
+            if shard.owner.is_alive():
+                live.append(shard)
+                continue
+            for operation, value in shard.counts.items():
+                base.counts[operation] = base.counts.get(operation, 0) + value
+            for operation, value in shard.flushed.items():
+                base.flushed[operation] = base.flushed.get(operation, 0) + value
+        self.shards = live
+
+    def _take_batch(self):
+        with self.lock:
+            n = min(len(self.records), self.batch_size)
+            return [self.records.popleft() for _ in range(n)]
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Write everything counted and queued so far; returns False if Redis is unavailable"""
+        with self.flush_lock:
+            counts, states = self._take_counts()
+            try:
+                while True:
+                    batch = self._take_batch()
+                    if not self.available():
+                        self.dropped.labels(reason='circuit_open').inc(len(batch))
+                        if not self.records:
+                            return False
+                        continue
+                    if not self._write(counts, batch):
+                        return False
+                    for shard, current in states:
+                        shard.flushed = current
+                    counts, states = {}, []
+                    if not self.records:
+                        return True
+            finally:
+                # What is left after this flush, on every return path
+                self.queue_size.set(len(self.records))
+
+    def _write(self, counts, records):
+        if not counts and not records:
+            return True
+        pipe = self.client.pipeline(transaction=False)
+        for operation, count in counts.items():
+            pipe.incrby(f'operations:{operation}', count)
+        for record in records:
+            pipe.xadd(self.recent_key, {'r': RECENT_RECORD.pack(*record)},
+                      maxlen=self.recent_maxlen, approximate=True)
+        try:
+            pipe.execute()
+        except redis.exceptions.RedisError as e:
+            # The counts stay pending, only the records are lost
+            self.dropped.labels(reason='redis_error').inc(len(records))
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if not self.open_until:
+                    logger.warning('Redis unavailable (%s), pausing operation tracking for %.0fs',
+                                   e, self.reset_timeout)
+                self.open_until = time.monotonic() + self.reset_timeout
+                self.circuit_open.set(1)
+            return False
+
+        if self.open_until:
+            logger.info('Redis reachable again, operation tracking resumed')
+        self.failures = 0
+        self.open_until = 0.0
+        self.circuit_open.set(0)
+        return True
+
+
+def tracker_from_env(service, client=None, registry=REGISTRY):
+    """OperationTracker configured from the TRACKING_* environment variables"""
+    return OperationTracker(
+        service,
+        client if client is not None else redis_from_env(),
+        max_queue=int(os.getenv('TRACKING_QUEUE_SIZE', 10000)),
+        batch_size=int(os.getenv('TRACKING_BATCH_SIZE', 500)),
+        flush_interval=float(os.getenv('TRACKING_FLUSH_INTERVAL', 0.25)),
+        flush_count=int(os.getenv('TRACKING_FLUSH_COUNT', 1000)),
+        recent_maxlen=int(os.getenv('TRACKING_RECENT_MAXLEN', 1000)),
+        recent_sample_rate=float(os.getenv('TRACKING_RECENT_SAMPLE_RATE', 1.0)),
+        registry=registry
+    )
+
+
+def read_recent_operations(client, services, last_ids=None, count=100):
+    """Recent operations of ``services`` newer than ``last_ids``, oldest first.
+
+    ``last_ids`` maps a service to the stream ID of the last record already
+    seen; services without one start from their ``count`` newest records.
+    ``client`` must return raw bytes (``redis_from_env(decode_responses=False)``).
+    Returns the records and the updated ``last_ids``, to pass to the next call.
+    """
+    last_ids = dict(last_ids or {})
+    entries = {}
+
+    following = {recent_stream_key(s): last_ids[s] for s in services if last_ids.get(s)}
+    if following:
+        for key, items in client.xread(following, count=count):
+            entries[key.decode() if isinstance(key, bytes) else key] = items
+    starting = [s for s in services if not last_ids.get(s)]
+    if starting:
+        pipe = client.pipeline(transaction=False)
+        for service in starting:
+            pipe.xrevrange(recent_stream_key(service), count=count)
+        for service, items in zip(starting, pipe.execute()):
+            entries[recent_stream_key(service)] = items[::-1]
+
+    records = []
+    for service in services:
+        for entry_id, fields in entries.get(recent_stream_key(service), ()):
+            entry_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+            num1, num2, result, timestamp = RECENT_RECORD.unpack(fields[b'r'])
+            records.append({'id': entry_id, 'operation': service, 'num1': num1, 'num2': num2,
+                            'result': result, 'timestamp': timestamp})
+            last_ids[service] = entry_id
+    records.sort(key=lambda record: record['timestamp'])
+    return records, last_ids
@@ -1,43 +1,22 @@
-from flask import Flask, request, jsonify
-import time
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+import operator
+import os
+import sys
 
-app = Flask(__name__)
+# Make the shared calculator_core and serving packages importable when run from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Metrics
-REQUEST_COUNT = Counter('addition_requests_total', 'Total addition requests')
-REQUEST_LATENCY = Histogram('addition_request_latency_seconds', 'Addition request latency')
-ERROR_COUNT = Counter('addition_errors_total', 'Total addition errors')
+from calculator_core import create_service_app
+from serving import run
 
 
-@app.route('/calculate', methods=['POST'])
-def calculate():
-    start_time = time.time()
-    REQUEST_COUNT.inc()
+def nonzero_divisor(num1, num2):
+    return num2 != 0
 
-    data = request.json
-    try:
-        num1 = float(data['num1'])
-        num2 = float(data['num2'])
 
-        if num2 == 0:
-            return jsonify({'error': 'Division by zero is not allowed'}), 400
-
-        result = num1 / num2
-        return jsonify({'result': result, 'operation': 'division'})
-    except (ValueError, KeyError) as e:
-        return jsonify({'error': 'Invalid input'}), 400
-
-
-@app.route('/health', methods=['GET'])
-def health():
-    return jsonify({'status': 'healthy', 'service': 'division'})
-
-
-@app.route('/metrics', methods=['GET'])
-def metrics():
-    return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+app = create_service_app('division', operator.truediv, rules=[
+    (nonzero_divisor, 'Division by zero is not allowed')
+])
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001)
\ No newline at end of file
+    run(app, port=5004)
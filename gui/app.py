@@ -1,97 +1,64 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, g, render_template, request, jsonify
 import requests
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from prometheus_client import CONTENT_TYPE_LATEST
+
+# Make the shared serving package importable when run from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serving import metrics_payload, run
+from serving.tracing import NO_TRACE, TRACEPARENT_HEADER, tracer_from_env
+from batch import BatchError, chunk_payload, chunk_results, merge_results, split_batch
+from cache import cache_from_env, cache_key
+from expressions import EvaluationError, ExpressionError, compile_expression, execute
+from traces import trace_from_env
+from upstream import build_backends
 
 app = Flask(__name__)
 
-# Service URLs (will be set via environment variables in Kubernetes)
-ADDITION_SERVICE = os.getenv('ADDITION_SERVICE', 'http://localhost:5001')
-SUBTRACTION_SERVICE = os.getenv('SUBTRACTION_SERVICE', 'http://localhost:5002')
-MULTIPLICATION_SERVICE = os.getenv('MULTIPLICATION_SERVICE', 'http://localhost:5003')
-DIVISION_SERVICE = os.getenv('DIVISION_SERVICE', 'http://localhost:5004')
+# One long-lived connection pool per backend service. URLs come from the
+# *_SERVICE environment variables (set in Kubernetes / docker-compose).
+BACKENDS = build_backends()
+
+# Optional cache of backend responses (RESULT_CACHE_ENABLED), None when disabled
+RESULT_CACHE = cache_from_env()
+
+# Backend statuses that are deterministic for a given input and may be cached
+CACHEABLE_STATUSES = (200, 400)
+
+# Optional request trace for replay in the simulator (TRACE_FILE), None when disabled
+TRACE = trace_from_env()
+
+# Optional distributed tracing (TRACING_FILE / TRACING_COLLECTOR), None when disabled
+TRACER = tracer_from_env('gui')
+
+# Endpoints whose requests are traced
+TRACED_ENDPOINTS = {'calculate'}
+
+# Largest number of backend calls a single /evaluate expression may need
+EVALUATE_MAX_CALLS = int(os.getenv('EVALUATE_MAX_CALLS', 100))
+
+# Backend calls that batches and expressions may have in flight at once
+fanout_executor = ThreadPoolExecutor(max_workers=int(os.getenv('FANOUT_WORKERS', 8)))
+
+
+@app.before_request
+def start_trace():
+    if TRACER and request.endpoint in TRACED_ENDPOINTS:
+        g.trace = TRACER.start(f'{request.method} {request.path}', request.headers.get(TRACEPARENT_HEADER))
+
+
+@app.after_request
+def finish_trace(response):
+    g.get('trace', NO_TRACE).finish(status=str(response.status_code))
+    return response
 
 
 @app.route('/')
 def index():
-    return '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Kubernetes Calculator</title>
-        <style>
-            body { font-family: Arial, sans-serif; margin: 40px; }
-            .calculator { max-width: 300px; margin: 0 auto; }
-            input, select, button { 
-                width: 100%; 
-                padding: 10px; 
-                margin: 5px 0; 
-                font-size: 16px; 
-            }
-            .result { 
-                margin-top: 20px; 
-                padding: 10px; 
-                background: #f0f0f0; 
-                border-radius: 5px; 
-            }
-        </style>
-    </head>
-    <body>
-        <div class="calculator">
-            <h2>Kubernetes Calculator</h2>
-            <input type="number" id="num1" placeholder="First number" step="any" required>
-            <input type="number" id="num2" placeholder="Second number" step="any" required>
-            <select id="operation">
-                <option value="add">Addition (+)</option>
-                <option value="subtract">Subtraction (-)</option>
-                <option value="multiply">Multiplication (*)</option>
-                <option value="divide">Division (/)</option>
-            </select>
-            <button onclick="calculate()">Calculate</button>
-            <div id="result" class="result"></div>
-        </div>
-
-        <script>
-            async function calculate() {
-                const num1 = parseFloat(document.getElementById('num1').value);
-                const num2 = parseFloat(document.getElementById('num2').value);
-                const operation = document.getElementById('operation').value;
-
-                if (isNaN(num1) || isNaN(num2)) {
-                    alert('Please enter valid numbers');
-                    return;
-                }
-
-                try {
-                    const response = await fetch('/calculate', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                        },
-                        body: JSON.stringify({
-                            num1: num1,
-                            num2: num2,
-                            operation: operation
-                        })
-                    });
-
-                    const data = await response.json();
-
-                    if (response.ok) {
-                        document.getElementById('result').innerHTML = 
-                            `<strong>Result:</strong> ${data.result}`;
-                    } else {
-                        document.getElementById('result').innerHTML = 
-                            `<strong>Error:</strong> ${data.error}`;
-                    }
-                } catch (error) {
-                    document.getElementById('result').innerHTML = 
-                        `<strong>Error:</strong> Service unavailable`;
-                }
-            }
-        </script>
-    </body>
-    </html>
-    '''
+    return render_template('index.html')
 
 
 @app.route('/calculate', methods=['POST'])
@@ -101,25 +68,103 @@ def calculate():
     num2 = data['num2']
     operation = data['operation']
 
-    service_urls = {
-        'add': ADDITION_SERVICE,
-        'subtract': SUBTRACTION_SERVICE,
-        'multiply': MULTIPLICATION_SERVICE,
-        'divide': DIVISION_SERVICE
-    }
-
-    service_url = service_urls.get(operation)
-    if not service_url:
+    backend = BACKENDS.get(operation)
+    if not backend:
         return jsonify({'error': 'Invalid operation'}), 400
 
+    if TRACE:
+        TRACE.record(operation, num1, num2)
+
+    key = cache_key(operation, num1, num2) if RESULT_CACHE else None
+    if key is not None:
+        cached = RESULT_CACHE.get(key)
+        if cached is not None:
+            body, status = cached
+            return jsonify(body), status
+
+    trace = g.get('trace', NO_TRACE)
     try:
-        response = requests.post(f"{service_url}/calculate",
-                                 json={'num1': num1, 'num2': num2},
-                                 timeout=5)
-        return jsonify(response.json()), response.status_code
+        with trace.span(f'upstream {backend.name}') as span:
+            response = backend.post('/calculate', {'num1': num1, 'num2': num2}, headers=trace.headers(span))
+            body = response.json()
     except requests.exceptions.RequestException as e:
         return jsonify({'error': f'Service unavailable: {str(e)}'}), 503
 
+    if key is not None and response.status_code in CACHEABLE_STATUSES:
+        RESULT_CACHE.put(key, (body, response.status_code), is_error=response.status_code != 200)
+    return jsonify(body), response.status_code
+
+
+def dispatch_batch(backend, chunk):
+    """Send one chunk of (index, num1, num2) to a backend's /calculate/batch"""
+    try:
+        response = backend.post('/calculate/batch', chunk_payload(chunk))
+        data = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return [{'error': f'Service unavailable: {str(e)}'}] * len(chunk)
+    return chunk_results(response.status_code, data, len(chunk))
+
+
+@app.route('/calculate/batch', methods=['POST'])
+def calculate_batch():
+    """Split a mixed-operation batch by operation, fan out and reassemble in order"""
+    try:
+        results, chunks = split_batch(request.json, BACKENDS)
+    except BatchError as e:
+        return jsonify({'error': e.message}), e.status
+
+    if len(chunks) == 1:
+        operation, chunk = chunks[0]
+        outcomes = [dispatch_batch(BACKENDS[operation], chunk)]
+    else:
+        outcomes = list(fanout_executor.map(
+            lambda args: dispatch_batch(BACKENDS[args[0]], args[1]), chunks))
+    return jsonify({'results': merge_results(results, chunks, outcomes)})
+
+
+def dispatch_operation(operation, num1, num2):
+    """One /calculate call for an expression node, as (status, body)"""
+    try:
+        response = BACKENDS[operation].post('/calculate', {'num1': num1, 'num2': num2})
+        return response.status_code, response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return 503, {'error': f'Service unavailable: {str(e)}'}
+
+
+@app.route('/evaluate', methods=['POST'])
+def evaluate():
+    """Evaluate an arithmetic expression, running independent sub-expressions concurrently"""
+    data = request.json
+    try:
+        plan = compile_expression(data['expression'], data.get('variables'), EVALUATE_MAX_CALLS)
+    except (KeyError, TypeError, AttributeError):
+        return jsonify({'error': 'Invalid input'}), 400
+    except ExpressionError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        result, stats = execute(plan, dispatch_operation, fanout_executor)
+    except EvaluationError as e:
+        return jsonify({'error': e.message, 'expression': e.expression}), e.status
+
+    return jsonify({'result': result, **stats})
+
+
+@app.route('/pool/stats', methods=['GET'])
+def pool_stats():
+    """Connection pool usage per backend, for sizing UPSTREAM_POOL_MAXSIZE"""
+    return jsonify({backend.name: backend.pool_stats() for backend in BACKENDS.values()})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return metrics_payload(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    if os.getenv('GUI_MODE') == 'async':
+        # Event-loop gateway with per-backend concurrency limits
+        import gateway
+        gateway.main()
+    else:
+        run(app, port=5000)
\ No newline at end of file
@@ -0,0 +1,79 @@
+import math
+
+from upstream import env_int
+
+# Batch settings: request size limit and operand pairs per backend call
+BATCH_MAX_SIZE = env_int('BATCH_MAX_SIZE', 10000)
+BATCH_CHUNK_SIZE = env_int('BATCH_CHUNK_SIZE', 1000)
+
+
+class BatchError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def parse_operand(value):
+    """Batch operand as a finite float, None when it is missing or not a number"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def split_batch(data, operations, max_size=BATCH_MAX_SIZE, chunk_size=BATCH_CHUNK_SIZE):
+    """Group a mixed-operation batch into backend calls.
+
+    Returns the results list, already holding the error of every malformed
+    item, and the (operation, [(index, num1, num2), ...]) chunks to send.
+    Raises BatchError when the batch as a whole is invalid.
+    """
+    try:
+        items = data['operations']
+        if len(items) > max_size:
+            raise BatchError(f'Batch size exceeds {max_size}', 413)
+        groups = {}
+        results = [None] * len(items)
+        for index, item in enumerate(items):
+            operation = item['operation']
+            if operation not in operations:
+                raise BatchError('Invalid operation')
+            num1, num2 = parse_operand(item.get('num1')), parse_operand(item.get('num2'))
+            if num1 is None or num2 is None:
+                # Rejected here, so that one malformed item does not fail its whole chunk
+                results[index] = {'error': 'Invalid input'}
+            else:
+                groups.setdefault(operation, []).append((index, num1, num2))
+    except (KeyError, TypeError, AttributeError):
+        raise BatchError('Invalid input')
+
+    chunks = [(operation, group[start:start + chunk_size])
+              for operation, group in groups.items()
+              for start in range(0, len(group), chunk_size)]
+    return results, chunks
+
+
+def chunk_payload(chunk):
+    return {'num1': [num1 for _, num1, _ in chunk],
+            'num2': [num2 for _, _, num2 in chunk]}
+
+
+def chunk_results(status, data, size):
+    """Per-item results of one backend /calculate/batch response"""
+    if status != 200:
+        return [{'error': data.get('error', 'Invalid input')}] * size
+
+    errors = {error['index']: error['error'] for error in data.get('errors', ())}
+    operation = data['operation']
+    return [{'error': errors[i]} if i in errors else {'result': result, 'operation': operation}
+            for i, result in enumerate(data['results'])]
+
+
+def merge_results(results, chunks, outcomes):
+    """Put the per-item results of every chunk back in request order"""
+    for (_, chunk), outcome in zip(chunks, outcomes):
+        for (index, _, _), result in zip(chunk, outcome):
+            results[index] = result
+    return results
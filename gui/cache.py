@@ -0,0 +1,86 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from prometheus_client import Counter, Gauge
+
+from upstream import env_bool, env_float, env_int
+
+CACHE_HITS = Counter('gui_cache_hits_total', 'Result cache hits', ['kind'])
+CACHE_MISSES = Counter('gui_cache_misses_total', 'Result cache misses')
+CACHE_EVICTIONS = Counter('gui_cache_evictions_total', 'Result cache evictions', ['reason'])
+CACHE_ENTRIES = Gauge('gui_cache_entries', 'Entries held in the result cache',
+                      multiprocess_mode='livesum')
+
+
+def cache_key(operation, num1, num2):
+    """Normalized key for an (operation, num1, num2) request, or None if uncacheable"""
+    try:
+        num1 = float(num1)
+        num2 = float(num2)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(num1) or math.isnan(num2):
+        return None
+    # repr, unlike the float, tells -0.0 from 0.0, whose results can differ in sign
+    return operation, repr(num1), repr(num2)
+
+
+class ResultCache:
+    """Bounded LRU cache of backend responses with a TTL per entry.
+
+    Successful results live for ``ttl`` seconds. Error responses that the
+    backend returns deterministically for the same input, such as division by
+    zero, are kept under their own ``error_ttl`` (0 disables caching them).
+    """
+
+    def __init__(self, max_size=10000, ttl=300.0, error_ttl=60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                CACHE_MISSES.inc()
+                return None
+            expires, is_error, value = entry
+            if expires <= now:
+                del self.entries[key]
+                CACHE_ENTRIES.dec()
+                CACHE_EVICTIONS.labels(reason='expired').inc()
+                CACHE_MISSES.inc()
+                return None
+            self.entries.move_to_end(key)
+        CACHE_HITS.labels(kind='error' if is_error else 'result').inc()
+        return value
+
+    def put(self, key, value, is_error=False):
+        ttl = self.error_ttl if is_error else self.ttl
+        if ttl <= 0:
+            return
+        with self.lock:
+            if key not in self.entries:
+                CACHE_ENTRIES.inc()
+            self.entries[key] = (time.monotonic() + ttl, is_error, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                CACHE_ENTRIES.dec()
+                CACHE_EVICTIONS.labels(reason='capacity').inc()
+
+
+def cache_from_env():
+    """ResultCache configured from RESULT_CACHE_* env vars, or None when disabled"""
+    if not env_bool('RESULT_CACHE_ENABLED', False):
+        return None
+    return ResultCache(
+        max_size=env_int('RESULT_CACHE_SIZE', 10000),
+        ttl=env_float('RESULT_CACHE_TTL', 300.0),
+        error_ttl=env_float('RESULT_CACHE_ERROR_TTL', 60.0)
+    )
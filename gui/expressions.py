@@ -0,0 +1,224 @@
+import ast
+import asyncio
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# Arithmetic operators accepted in expressions and the backend operation of each
+OPERATORS = {
+    ast.Add: 'add',
+    ast.Sub: 'subtract',
+    ast.Mult: 'multiply',
+    ast.Div: 'divide'
+}
+SYMBOLS = {'add': '+', 'subtract': '-', 'multiply': '*', 'divide': '/'}
+
+MAX_EXPRESSION_LENGTH = 4096
+
+
+class ExpressionError(Exception):
+    pass
+
+
+class EvaluationError(Exception):
+    def __init__(self, message, status, expression):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.expression = expression
+
+
+class Plan:
+    """An expression compiled into a DAG of backend calls.
+
+    ``nodes`` is in topological order. A node is either ``('value', number)``
+    or ``('op', operation, left, right)`` where left/right are node indexes.
+    Identical sub-expressions share one node, so each is computed once.
+    """
+
+    def __init__(self):
+        self.nodes = []
+        self.index = {}
+        self.root = None
+
+    def add(self, node):
+        if node not in self.index:
+            self.index[node] = len(self.nodes)
+            self.nodes.append(node)
+        return self.index[node]
+
+    @property
+    def calls(self):
+        return sum(1 for node in self.nodes if node[0] == 'op')
+
+    def describe(self, i):
+        node = self.nodes[i]
+        if node[0] == 'value':
+            return repr(node[1])
+        _, operation, left, right = node
+        return f"({self.describe(left)} {SYMBOLS[operation]} {self.describe(right)})"
+
+
+def compile_expression(expression, variables=None, max_calls=100):
+    """Parse an arithmetic expression into a Plan"""
+    variables = variables or {}
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f'Expression longer than {MAX_EXPRESSION_LENGTH} characters')
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        raise ExpressionError('Invalid expression')
+
+    plan = Plan()
+
+    def leaf(node):
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return plan.add(('value', float(node.value)))
+        if isinstance(node, ast.Name):
+            try:
+                return plan.add(('value', float(variables[node.id])))
+            except KeyError:
+                raise ExpressionError(f'Unknown variable: {node.id}')
+            except (TypeError, ValueError):
+                raise ExpressionError(f'Invalid value for variable: {node.id}')
+        raise ExpressionError('Only numbers, variables and + - * / are allowed')
+
+    # Post-order walk with an explicit stack, so that deeply nested input such
+    # as 1+1+...+1 or ------1 cannot exhaust the interpreter's recursion limit
+    indexes = []
+    stack = [(tree.body, False)]
+    while stack:
+        node, visited = stack.pop()
+        if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            if not visited:
+                stack.extend(((node, True), (node.right, False), (node.left, False)))
+                continue
+            right = indexes.pop()
+            left = indexes.pop()
+            indexes.append(plan.add(('op', OPERATORS[type(node.op)], left, right)))
+            if plan.calls > max_calls:
+                raise ExpressionError(f'Expression needs more than {max_calls} backend calls')
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+            if not visited:
+                stack.extend(((node, True), (node.operand, False)))
+                continue
+            if isinstance(node.op, ast.USub):
+                operand = indexes.pop()
+                if plan.nodes[operand][0] == 'value':
+                    indexes.append(plan.add(('value', -plan.nodes[operand][1])))
+                else:
+                    indexes.append(plan.add(('op', 'subtract', plan.add(('value', 0.0)), operand)))
+                    if plan.calls > max_calls:
+                        raise ExpressionError(f'Expression needs more than {max_calls} backend calls')
+        else:
+            indexes.append(leaf(node))
+
+    plan.root = indexes.pop()
+    return plan
+
+
+class _Schedule:
+    """Bookkeeping of one Plan run: node values, finish times and the calls that became ready"""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.values = {}
+        self.finished = {}
+        self.parents = {}
+        self.pending = {}
+        for i, node in enumerate(plan.nodes):
+            if node[0] == 'value':
+                self.values[i] = node[1]
+                self.finished[i] = 0.0
+            else:
+                children = {node[2], node[3]}
+                self.pending[i] = len(children)
+                for child in children:
+                    self.parents.setdefault(child, []).append(i)
+        self.start = time.perf_counter()
+
+    def _release(self, i):
+        ready = []
+        for parent in self.parents.get(i, ()):
+            self.pending[parent] -= 1
+            if self.pending[parent] == 0:
+                del self.pending[parent]
+                ready.append(parent)
+        return ready
+
+    def ready(self):
+        """Calls whose operands are all literal values"""
+        return [parent for leaf in list(self.values) for parent in self._release(leaf)]
+
+    def call(self, i):
+        _, operation, left, right = self.plan.nodes[i]
+        return operation, self.values[left], self.values[right]
+
+    def complete(self, i, status, body, latency):
+        """Record the outcome of call ``i`` and return the calls it made ready"""
+        if status != 200:
+            raise EvaluationError(body.get('error', 'Evaluation failed'), status, self.plan.describe(i))
+        self.values[i] = body['result']
+        _, _, left, right = self.plan.nodes[i]
+        # Finish time on the critical path: slowest input plus this call
+        self.finished[i] = max(self.finished[left], self.finished[right]) + latency
+        return self._release(i)
+
+    def outcome(self):
+        root = self.plan.root
+        return self.values[root], {
+            'backend_calls': self.plan.calls,
+            'critical_path_ms': round(self.finished[root] * 1000, 3),
+            'elapsed_ms': round((time.perf_counter() - self.start) * 1000, 3)
+        }
+
+
+def execute(plan, dispatch, executor):
+    """Run a Plan, dispatching every ready node concurrently.
+
+    ``dispatch(operation, num1, num2)`` performs one backend call and returns
+    ``(status, body)``. Returns the root value and stats about the run.
+    """
+    schedule = _Schedule(plan)
+
+    def timed_dispatch(i):
+        start = time.perf_counter()
+        status, body = dispatch(*schedule.call(i))
+        return status, body, time.perf_counter() - start
+
+    running = {executor.submit(timed_dispatch, i): i for i in schedule.ready()}
+    try:
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                for ready in schedule.complete(i, *future.result()):
+                    running[executor.submit(timed_dispatch, ready)] = ready
+    finally:
+        for future in running:
+            future.cancel()
+
+    return schedule.outcome()
+
+
+async def execute_async(plan, dispatch):
+    """``execute`` for the async gateway: ``dispatch`` is a coroutine function, calls run as tasks"""
+    schedule = _Schedule(plan)
+
+    async def timed_dispatch(i):
+        start = time.perf_counter()
+        status, body = await dispatch(*schedule.call(i))
+        return status, body, time.perf_counter() - start
+
+    running = {asyncio.ensure_future(timed_dispatch(i)): i for i in schedule.ready()}
+    try:
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                i = running.pop(task)
+                for ready in schedule.complete(i, *task.result()):
+                    running[asyncio.ensure_future(timed_dispatch(ready))] = ready
+    finally:
+        for task in running:
+            task.cancel()
+
+    return schedule.outcome()
@@ -0,0 +1,297 @@
+import asyncio
+import json
+import os
+
+import aiohttp
+from aiohttp import web
+from prometheus_client import Counter, Gauge, CONTENT_TYPE_LATEST
+
+from serving import metrics_payload, run
+from serving.tracing import NO_TRACE, TRACEPARENT_HEADER, tracer_from_env
+from batch import BatchError, chunk_payload, chunk_results, merge_results, split_batch
+from cache import cache_from_env, cache_key
+from expressions import EvaluationError, ExpressionError, compile_expression, execute_async
+from traces import trace_from_env
+from upstream import BACKEND_SERVICES, env_float, env_int
+
+# Async gateway: same HTTP contract as the Flask GUI, but upstream calls are
+# multiplexed on one event loop instead of blocking a worker each.
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'index.html')
+
+# Per-backend concurrency and backpressure metrics
+IN_FLIGHT = Gauge('gui_gateway_in_flight', 'Upstream calls in flight',
+                  ['backend'], multiprocess_mode='livesum')
+WAITING = Gauge('gui_gateway_waiting', 'Requests queued for a backend slot',
+                ['backend'], multiprocess_mode='livesum')
+REJECTED = Counter('gui_gateway_rejected_total',
+                   'Requests rejected because the backend queue was full', ['backend'])
+
+
+class BackendOverloaded(Exception):
+    pass
+
+
+class AsyncBackend:
+    """Pooled aiohttp client for one operation service with bounded concurrency.
+
+    At most ``concurrency`` calls are in flight; up to ``queue_size`` more may
+    wait for a slot. Anything beyond that is rejected immediately so a slow
+    backend sheds load instead of piling up requests in the gateway.
+    """
+
+    def __init__(self, name, base_url, concurrency=50, queue_size=100, timeout=5.0,
+                 connect_timeout=1.0, keepalive_idle=60):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.keepalive_idle = keepalive_idle
+        self.session = None
+        self.semaphore = None
+        self.in_flight = IN_FLIGHT.labels(name)
+        self.waiting = WAITING.labels(name)
+        self.waiting_count = 0
+        self.in_flight_count = 0
+        self.rejected = REJECTED.labels(name)
+        self.rejected_count = 0
+
+    async def start(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency,
+                                         keepalive_timeout=self.keepalive_idle)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                             raise_for_status=False)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def post(self, path, payload, headers=None):
+        """POST JSON to the backend and return (status, raw body bytes)"""
+        if self.semaphore.locked() and self.waiting_count >= self.queue_size:
+            self.rejected.inc()
+            self.rejected_count += 1
+            raise BackendOverloaded(self.name)
+
+        self.waiting_count += 1
+        self.waiting.inc()
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting_count -= 1
+            self.waiting.dec()
+
+        self.in_flight.inc()
+        self.in_flight_count += 1
+        try:
+            async with self.session.post(f"{self.base_url}{path}", json=payload, headers=headers) as response:
+                return response.status, await response.read()
+        finally:
+            self.in_flight.dec()
+            self.in_flight_count -= 1
+            self.semaphore.release()
+
+    def pool_stats(self):
+        return {
+            'in_flight': self.in_flight_count,
+            'waiting': self.waiting_count,
+            'rejected': self.rejected_count,
+            'concurrency': self.concurrency,
+            'queue_size': self.queue_size,
+            'url': self.base_url
+        }
+
+
+def build_async_backends():
+    """Create one AsyncBackend per operation; GATEWAY_* defaults, per-service overrides"""
+    concurrency = env_int('GATEWAY_CONCURRENCY', 50)
+    queue_size = env_int('GATEWAY_QUEUE_SIZE', 100)
+    timeout = env_float('UPSTREAM_TIMEOUT', 5.0)
+    connect_timeout = env_float('UPSTREAM_CONNECT_TIMEOUT', 1.0)
+    keepalive_idle = env_int('UPSTREAM_KEEPALIVE_IDLE', 60)
+
+    backends = {}
+    for operation, (name, url_var, default_url) in BACKEND_SERVICES.items():
+        prefix = url_var[:-len('_SERVICE')]
+        backends[operation] = AsyncBackend(
+            name,
+            os.getenv(url_var, default_url),
+            concurrency=env_int(f'{prefix}_CONCURRENCY', concurrency),
+            queue_size=env_int(f'{prefix}_QUEUE_SIZE', queue_size),
+            timeout=env_float(f'{prefix}_TIMEOUT', timeout),
+            connect_timeout=env_float(f'{prefix}_CONNECT_TIMEOUT', connect_timeout),
+            keepalive_idle=env_int(f'{prefix}_KEEPALIVE_IDLE', keepalive_idle)
+        )
+    return backends
+
+
+def error_response(message, status):
+    return web.json_response({'error': message}, status=status)
+
+
+async def index(request):
+    return web.FileResponse(INDEX_PATH)
+
+
+async def calculate(request):
+    try:
+        data = await request.json()
+        num1 = data['num1']
+        num2 = data['num2']
+        operation = data['operation']
+    except (ValueError, KeyError, TypeError):
+        return error_response('Invalid input', 400)
+
+    backend = request.app['backends'].get(operation)
+    if not backend:
+        return error_response('Invalid operation', 400)
+
+    trace = request.app['trace']
+    if trace:
+        trace.record(operation, num1, num2)
+
+    cache = request.app['cache']
+    key = cache_key(operation, num1, num2) if cache else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            status, body = cached
+            return web.Response(body=body, status=status, content_type='application/json')
+
+    trace = request.get('trace', NO_TRACE)
+    try:
+        with trace.span(f'upstream {backend.name}') as span:
+            status, body = await backend.post('/calculate', {'num1': num1, 'num2': num2},
+                                              headers=trace.headers(span))
+    except BackendOverloaded:
+        return error_response(f'Service overloaded: {backend.name}', 503)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return error_response(f'Service unavailable: {str(e) or type(e).__name__}', 503)
+
+    # Only deterministic outcomes are cached: results and input errors
+    if key is not None and status in (200, 400):
+        cache.put(key, (status, body), is_error=status != 200)
+
+    # Pass the backend's JSON through untouched instead of re-encoding it
+    return web.Response(body=body, status=status, content_type='application/json')
+
+
+async def dispatch_batch(backend, chunk):
+    """Send one chunk of (index, num1, num2) to a backend's /calculate/batch"""
+    try:
+        status, body = await backend.post('/calculate/batch', chunk_payload(chunk))
+        data = json.loads(body)
+    except BackendOverloaded:
+        return [{'error': f'Service overloaded: {backend.name}'}] * len(chunk)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        return [{'error': f'Service unavailable: {str(e) or type(e).__name__}'}] * len(chunk)
+    return chunk_results(status, data, len(chunk))
+
+
+async def calculate_batch(request):
+    """Split a mixed-operation batch by operation, fan out and reassemble in order"""
+    backends = request.app['backends']
+    try:
+        results, chunks = split_batch(await request.json(), backends)
+    except ValueError:
+        return error_response('Invalid input', 400)
+    except BatchError as e:
+        return error_response(e.message, e.status)
+
+    outcomes = await asyncio.gather(*(dispatch_batch(backends[operation], chunk)
+                                      for operation, chunk in chunks))
+    return web.json_response({'results': merge_results(results, chunks, outcomes)})
+
+
+async def evaluate(request):
+    """Evaluate an arithmetic expression, running independent sub-expressions concurrently"""
+    backends = request.app['backends']
+    try:
+        data = await request.json()
+        plan = compile_expression(data['expression'], data.get('variables'), request.app['evaluate_max_calls'])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return error_response('Invalid input', 400)
+    except ExpressionError as e:
+        return error_response(str(e), 400)
+
+    async def dispatch_operation(operation, num1, num2):
+        backend = backends[operation]
+        try:
+            status, body = await backend.post('/calculate', {'num1': num1, 'num2': num2})
+            return status, json.loads(body)
+        except BackendOverloaded:
+            return 503, {'error': f'Service overloaded: {backend.name}'}
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            return 503, {'error': f'Service unavailable: {str(e) or type(e).__name__}'}
+
+    try:
+        result, stats = await execute_async(plan, dispatch_operation)
+    except EvaluationError as e:
+        return web.json_response({'error': e.message, 'expression': e.expression}, status=e.status)
+
+    return web.json_response({'result': result, **stats})
+
+
+async def pool_stats(request):
+    """Concurrency slots and queue usage per backend, for sizing GATEWAY_CONCURRENCY"""
+    return web.json_response({backend.name: backend.pool_stats()
+                              for backend in request.app['backends'].values()})
+
+
+@web.middleware
+async def tracing(request, handler):
+    """Trace /calculate requests when TRACING_FILE or TRACING_COLLECTOR is set"""
+    tracer = request.app['tracer']
+    if tracer is None or request.path != '/calculate':
+        return await handler(request)
+    trace = request['trace'] = tracer.start(f'{request.method} {request.path}',
+                                            request.headers.get(TRACEPARENT_HEADER))
+    response = await handler(request)
+    trace.finish(status=str(response.status))
+    return response
+
+
+async def metrics(request):
+    return web.Response(body=metrics_payload(), headers={'Content-Type': CONTENT_TYPE_LATEST})
+
+
+async def start_backends(app):
+    for backend in app['backends'].values():
+        await backend.start()
+
+
+async def close_backends(app):
+    for backend in app['backends'].values():
+        await backend.close()
+
+
+def create_app():
+    app = web.Application(middlewares=[tracing])
+    app['backends'] = build_async_backends()
+    app['cache'] = cache_from_env()
+    app['trace'] = trace_from_env()
+    app['tracer'] = tracer_from_env('gui')
+    app['evaluate_max_calls'] = env_int('EVALUATE_MAX_CALLS', 100)
+    app.on_startup.append(start_backends)
+    app.on_cleanup.append(close_backends)
+    app.router.add_get('/', index)
+    app.router.add_post('/calculate', calculate)
+    app.router.add_post('/calculate/batch', calculate_batch)
+    app.router.add_post('/evaluate', evaluate)
+    app.router.add_get('/pool/stats', pool_stats)
+    app.router.add_get('/metrics', metrics)
+    return app
+
+
+def main():
+    port = int(os.getenv('PORT', 5000))
+    if os.getenv('SERVER') == 'dev':
+        web.run_app(create_app(), host='0.0.0.0', port=port)
+    else:
+        # One event loop per gunicorn worker process
+        run(create_app(), port=port, worker_class='aiohttp.GunicornWebWorker')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import json
+import os
+import random
+import time
+
+from prometheus_client import Counter
+
+from upstream import env_float
+
+TRACE_RECORDS = Counter('gui_trace_records_total', 'Requests written to the trace file')
+
+
+class TraceRecorder:
+    """Appends one NDJSON line per /calculate request, for replay by the simulator.
+
+    Each line holds the wall-clock arrival time and the request, e.g.
+    ``{"t":1700000000.123,"operation":"add","num1":1,"num2":2}``. Every line is
+    a single O_APPEND write, so all gunicorn workers can share one file.
+    """
+
+    def __init__(self, path, sample_rate=1.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.fd = None
+        self.pid = None
+
+    def record(self, operation, num1, num2):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        if self.pid != os.getpid():
+            # Opened lazily so every forked worker gets its own descriptor
+            self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self.pid = os.getpid()
+        line = json.dumps({'t': time.time(), 'operation': operation, 'num1': num1, 'num2': num2},
+                          separators=(',', ':'))
+        try:
+            os.write(self.fd, (line + '\n').encode())
+        except OSError:
+            return
+        TRACE_RECORDS.inc()
+
+
+def trace_from_env():
+    """TraceRecorder writing to TRACE_FILE, or None when unset"""
+    path = os.getenv('TRACE_FILE')
+    if not path:
+        return None
+    return TraceRecorder(path, sample_rate=env_float('TRACE_SAMPLE_RATE', 1.0))
@@ -0,0 +1,243 @@
+import os
+import socket
+import threading
+
+import requests
+from prometheus_client import Counter, Gauge
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError
+
+# Backend services proxied by the GUI: operation -> (service name, env var, default URL)
+BACKEND_SERVICES = {
+    'add': ('addition', 'ADDITION_SERVICE', 'http://localhost:5001'),
+    'subtract': ('subtraction', 'SUBTRACTION_SERVICE', 'http://localhost:5002'),
+    'multiply': ('multiplication', 'MULTIPLICATION_SERVICE', 'http://localhost:5003'),
+    'divide': ('division', 'DIVISION_SERVICE', 'http://localhost:5004')
+}
+
+
+# Pool usage metrics. Gauges are summed over live worker processes so that
+# /metrics stays correct when the GUI runs with several gunicorn workers.
+POOL_CONNECTIONS = Gauge('gui_upstream_pool_connections', 'Pooled upstream connections by state',
+                         ['backend', 'state'], multiprocess_mode='livesum')
+POOL_MAXSIZE = Gauge('gui_upstream_pool_maxsize', 'Configured upstream pool size',
+                     ['backend'], multiprocess_mode='livesum')
+POOL_WAITS = Counter('gui_upstream_pool_waits_total',
+                     'Requests that had to wait for a free pooled connection', ['backend'])
+POOL_WAIT_TIMEOUTS = Counter('gui_upstream_pool_wait_timeouts_total',
+                             'Requests that gave up waiting for a pooled connection', ['backend'])
+
+
+def env_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+class PoolStats:
+    """Usage counters shared by every connection pool of one backend"""
+
+    def __init__(self, name):
+        self.lock = threading.Lock()
+        self.pools = []
+        self.active = 0
+        self.waits = 0
+        self.wait_timeouts = 0
+        self.requests = 0
+        self.active_gauge = POOL_CONNECTIONS.labels(name, 'active')
+        self.idle_gauge = POOL_CONNECTIONS.labels(name, 'idle')
+        self.maxsize_gauge = POOL_MAXSIZE.labels(name)
+        self.waits_counter = POOL_WAITS.labels(name)
+        self.wait_timeouts_counter = POOL_WAIT_TIMEOUTS.labels(name)
+
+    def count_idle(self):
+        idle = 0
+        for pool in self.pools:
+            if pool.pool is not None:
+                # The queue is pre-filled with None placeholders; only real
+                # connections sitting in it are idle keep-alive sockets.
+                idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        return idle
+
+    def snapshot(self):
+        with self.lock:
+            pools = list(self.pools)
+            data = {
+                'active': self.active,
+                'waits': self.waits,
+                'wait_timeouts': self.wait_timeouts,
+                'requests': self.requests
+            }
+        data['idle'] = self.count_idle()
+        data['opened'] = sum(pool.num_connections for pool in pools)
+        return data
+
+
+class _InstrumentedPoolMixin:
+    stats = None
+    wait_timeout = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        with self.stats.lock:
+            self.stats.pools.append(self)
+        # Pools are created on first use, i.e. inside the worker process
+        self.stats.maxsize_gauge.set(self.pool.maxsize)
+
+    def _get_conn(self, timeout=None):
+        if timeout is None:
+            timeout = self.wait_timeout
+        with self.stats.lock:
+            self.stats.requests += 1
+            if self.block and self.pool is not None and self.pool.empty():
+                self.stats.waits += 1
+                self.stats.waits_counter.inc()
+        try:
+            conn = super()._get_conn(timeout=timeout)
+        except EmptyPoolError:
+            with self.stats.lock:
+                self.stats.wait_timeouts += 1
+            self.stats.wait_timeouts_counter.inc()
+            raise
+        with self.stats.lock:
+            self.stats.active += 1
+            self.stats.active_gauge.inc()
+            self.stats.idle_gauge.set(self.stats.count_idle())
+        return conn
+
+    def _put_conn(self, conn):
+        super()._put_conn(conn)
+        with self.stats.lock:
+            self.stats.active -= 1
+            self.stats.active_gauge.dec()
+            self.stats.idle_gauge.set(self.stats.count_idle())
+
+    def close(self):
+        with self.stats.lock:
+            if self in self.stats.pools:
+                self.stats.pools.remove(self)
+        super().close()
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools report usage into a PoolStats"""
+
+    def __init__(self, stats, wait_timeout=None, socket_options=None, **kwargs):
+        self.stats = stats
+        self.wait_timeout = wait_timeout
+        self.socket_options = socket_options
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.socket_options is not None:
+            pool_kwargs['socket_options'] = self.socket_options
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        attrs = {'stats': self.stats, 'wait_timeout': self.wait_timeout}
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('InstrumentedHTTPConnectionPool',
+                         (_InstrumentedPoolMixin, HTTPConnectionPool), attrs),
+            'https': type('InstrumentedHTTPSConnectionPool',
+                          (_InstrumentedPoolMixin, HTTPSConnectionPool), attrs)
+        }
+
+
+def keepalive_socket_options(idle):
+    """TCP keep-alive probes so idle pooled sockets are not silently dropped"""
+    options = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+               (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle))
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, idle // 3)))
+    return options
+
+
+class Backend:
+    """Long-lived HTTP client for one operation service"""
+
+    def __init__(self, name, base_url, timeout=5.0, connect_timeout=1.0,
+                 pool_maxsize=10, pool_block=True, pool_wait_timeout=1.0,
+                 keepalive=True, keepalive_idle=60):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, timeout)
+        self.stats = PoolStats(name)
+
+        self.session = requests.Session()
+        if not keepalive:
+            self.session.headers['Connection'] = 'close'
+        adapter = PooledAdapter(
+            self.stats,
+            wait_timeout=pool_wait_timeout,
+            socket_options=keepalive_socket_options(keepalive_idle) if keepalive else None,
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=0
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool_maxsize = pool_maxsize
+
+    def post(self, path, payload, timeout=None, headers=None):
+        try:
+            return self.session.post(f"{self.base_url}{path}", json=payload,
+                                     timeout=timeout or self.timeout, headers=headers)
+        except EmptyPoolError as e:
+            # Every pooled connection stayed busy for the whole wait timeout
+            raise requests.exceptions.ConnectionError(
+                f'{self.name} connection pool exhausted') from e
+
+    def pool_stats(self):
+        data = self.stats.snapshot()
+        data['maxsize'] = self.pool_maxsize
+        data['url'] = self.base_url
+        return data
+
+    def close(self):
+        self.session.close()
+
+
+def build_backends():
+    """Create one pooled Backend per operation from the *_SERVICE env vars.
+
+    Global defaults come from UPSTREAM_* variables and can be overridden per
+    backend with the service prefix, e.g. DIVISION_TIMEOUT or ADDITION_POOL_MAXSIZE.
+    """
+    defaults = {
+        'timeout': env_float('UPSTREAM_TIMEOUT', 5.0),
+        'connect_timeout': env_float('UPSTREAM_CONNECT_TIMEOUT', 1.0),
+        'pool_maxsize': env_int('UPSTREAM_POOL_MAXSIZE', 10),
+        'pool_block': env_bool('UPSTREAM_POOL_BLOCK', True),
+        'pool_wait_timeout': env_float('UPSTREAM_POOL_WAIT_TIMEOUT', 1.0),
+        'keepalive': env_bool('UPSTREAM_KEEPALIVE', True),
+        'keepalive_idle': env_int('UPSTREAM_KEEPALIVE_IDLE', 60)
+    }
+
+    backends = {}
+    for operation, (name, url_var, default_url) in BACKEND_SERVICES.items():
+        prefix = url_var[:-len('_SERVICE')]
+        backends[operation] = Backend(
+            name,
+            os.getenv(url_var, default_url),
+            timeout=env_float(f'{prefix}_TIMEOUT', defaults['timeout']),
+            connect_timeout=env_float(f'{prefix}_CONNECT_TIMEOUT', defaults['connect_timeout']),
+            pool_maxsize=env_int(f'{prefix}_POOL_MAXSIZE', defaults['pool_maxsize']),
+            pool_block=env_bool(f'{prefix}_POOL_BLOCK', defaults['pool_block']),
+            pool_wait_timeout=env_float(f'{prefix}_POOL_WAIT_TIMEOUT', defaults['pool_wait_timeout']),
+            keepalive=env_bool(f'{prefix}_KEEPALIVE', defaults['keepalive']),
+            keepalive_idle=env_int(f'{prefix}_KEEPALIVE_IDLE', defaults['keepalive_idle'])
+        )
+    return backends
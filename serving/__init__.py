@@ -0,0 +1,121 @@
+"""Production launcher shared by every service of the calculator.
+
+``run(app, port)`` serves a Flask app with gunicorn: a pre-fork master with
+``WEB_WORKERS`` worker processes of ``WEB_THREADS`` threads each. Set
+``SERVER=dev`` to fall back to the Flask development server.
+
+With more than one worker, metrics are collected through prometheus_client's
+multiprocess mode. ``PROMETHEUS_MULTIPROC_DIR`` must be set before
+prometheus_client is imported (the service Dockerfiles set it), so that every
+worker writes its samples to that directory and ``/metrics`` merges them.
+"""
+import glob
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+from prometheus_client.openmetrics import exposition as openmetrics_exposition
+
+logger = logging.getLogger(__name__)
+
+
+def multiprocess_enabled():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def metrics_payload(registry=REGISTRY, openmetrics=False):
+    """Exposition of ``registry``, merged across worker processes when enabled"""
+    if multiprocess_enabled() and registry is REGISTRY:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    if openmetrics:
+        return openmetrics_exposition.generate_latest(registry)
+    return generate_latest(registry)
+
+
+def metrics_response(registry=REGISTRY, accept=None):
+    """(body, content type) for a scrape; OpenMetrics, which carries exemplars, when ``accept`` asks for it.
+
+    Exemplars are not kept in multiprocess mode, so they only show up with
+    a single worker.
+    """
+    if accept and 'application/openmetrics-text' in accept:
+        return metrics_payload(registry, openmetrics=True), openmetrics_exposition.CONTENT_TYPE_LATEST
+    return metrics_payload(registry), CONTENT_TYPE_LATEST
+
+
+def gunicorn_options(port, workers=None, threads=None):
+    threads = threads or int(os.getenv('WEB_THREADS', 4))
+    return {
+        'bind': f"0.0.0.0:{port}",
+        'workers': workers or int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count())),
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'keepalive': int(os.getenv('WEB_KEEPALIVE', 5)),
+        'timeout': int(os.getenv('WEB_TIMEOUT', 30)),
+        'graceful_timeout': int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30)),
+        'max_requests': int(os.getenv('WEB_MAX_REQUESTS', 0)),
+        'max_requests_jitter': int(os.getenv('WEB_MAX_REQUESTS_JITTER', 0)),
+        'backlog': int(os.getenv('WEB_BACKLOG', 2048)),
+        'accesslog': os.getenv('WEB_ACCESS_LOG') or None,
+        'on_starting': _on_starting,
+        'child_exit': _child_exit,
+    }
+
+
+def _on_starting(server):
+    # Samples left over from a previous run would be merged into /metrics
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
+
+
+def _child_exit(server, worker):
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def run(app, port, workers=None, worker_class=None, debug=False, on_worker_start=None, threads=None):
+    """Serve ``app`` on ``port``, with gunicorn unless SERVER=dev.
+
+    ``workers`` pins the worker count, e.g. to 1 for an app that keeps state
+    in its process, and ``threads`` the threads per worker. ``worker_class``
+    overrides the gunicorn worker, such as ``aiohttp.GunicornWebWorker`` for
+    an aiohttp application. ``on_worker_start`` runs in every worker process
+    once it has forked, which is where background threads have to be started.
+    """
+    if os.getenv('SERVER') == 'dev':
+        # Exit through SystemExit so atexit hooks, such as the final tracking flush, still run
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        if on_worker_start:
+            on_worker_start()
+        # The reloader would run the app, and on_worker_start, a second time in a child process
+        app.run(host='0.0.0.0', port=port, debug=debug, use_reloader=False)
+        return
+
+    from gunicorn.app.base import BaseApplication
+
+    options = gunicorn_options(port, workers, threads)
+    if worker_class:
+        options['worker_class'] = worker_class
+        options['threads'] = 1
+    if on_worker_start:
+        options['post_worker_init'] = lambda worker: on_worker_start()
+    if options['workers'] > 1 and not multiprocess_enabled():
+        logger.warning('PROMETHEUS_MULTIPROC_DIR is not set, /metrics will only '
+                       'report the worker that serves the scrape')
+
+    class Launcher(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    Launcher().run()
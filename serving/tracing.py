@@ -0,0 +1,229 @@
+"""Lightweight request tracing shared by the GUI and the operation services.
+
+The GUI decides whether a request is sampled and passes the decision on in a
+W3C ``traceparent`` header, so a trace is either complete across services or
+not recorded at all. An unsampled request costs one random draw and a shared
+no-op span; a sampled one keeps its spans in a list and exports them with a
+single write when it finishes.
+
+Tracing is enabled by ``TRACING_FILE`` (NDJSON, one span per line, shared by
+every worker through O_APPEND) or ``TRACING_COLLECTOR`` (``host:port`` of a
+local collector, one UDP datagram per trace; ``python -m serving.tracing``
+runs one that appends to a file). ``TRACING_SAMPLE_RATE`` is the share of
+requests sampled where a trace starts, 0.01 by default.
+"""
+import json
+import os
+import random
+import secrets
+import socket
+import sys
+import time
+
+from prometheus_client import Counter
+
+TRACEPARENT_HEADER = 'traceparent'
+
+TRACES_EXPORTED = Counter('tracing_traces_exported_total', 'Sampled traces handed to the exporter', ['result'])
+
+
+class Span:
+    __slots__ = ('trace', 'name', 'span_id', 'start', 'end', 'error')
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.error = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        self.trace.spans.append(self)
+
+
+class Trace:
+    """Spans of one request in one service; the request itself is the root span"""
+
+    sampled = True
+
+    def __init__(self, tracer, name, trace_id, parent_id=None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.spans = []
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+
+    def span(self, name):
+        """Context manager timing one step of the request"""
+        return Span(self, name)
+
+    def headers(self, span=None):
+        """Headers that make the next service's spans children of ``span`` (or of the request)"""
+        span_id = span.span_id if span is not None else self.span_id
+        return {TRACEPARENT_HEADER: f'00-{self.trace_id}-{span_id}-01'}
+
+    def finish(self, **attributes):
+        end = time.perf_counter()
+        service = self.tracer.service
+        records = [{'trace_id': self.trace_id, 'span_id': self.span_id, 'parent_id': self.parent_id,
+                    'service': service, 'name': self.name, 'start': self.wall_start,
+                    'duration_ms': (end - self.start) * 1000, 'attributes': attributes}]
+        for span in self.spans:
+            record = {'trace_id': self.trace_id, 'span_id': span.span_id, 'parent_id': self.span_id,
+                      'service': service, 'name': span.name,
+                      'start': self.wall_start + (span.start - self.start),
+                      'duration_ms': (span.end - span.start) * 1000}
+            if span.error:
+                record['error'] = span.error
+            records.append(record)
+        self.tracer.export(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records).encode())
+
+
+class _NullSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+class _NullTrace:
+    """Stand-in for a request that is not traced: every method is a no-op"""
+
+    sampled = False
+    trace_id = None
+
+    def span(self, name):
+        return NULL_SPAN
+
+    def headers(self, span=None):
+        return None
+
+    def finish(self, **attributes):
+        pass
+
+
+class _UnsampledTrace(_NullTrace):
+    def __init__(self):
+        # Tells the next service the request is not sampled, so it does not start a trace of its own.
+        # Nothing records the IDs of an unsampled request, so one pair made at import serves them all
+        self._headers = {TRACEPARENT_HEADER: f'00-{secrets.token_hex(16)}-{secrets.token_hex(8)}-00'}
+
+    def headers(self, span=None):
+        return self._headers
+
+
+NULL_SPAN = _NullSpan()
+# Tracing disabled
+NO_TRACE = _NullTrace()
+# Tracing enabled, request not sampled
+UNSAMPLED = _UnsampledTrace()
+
+
+def parse_traceparent(value):
+    """(trace_id, parent span id, sampled) of a traceparent header, or None if malformed"""
+    parts = value.split('-')
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class FileExporter:
+    """Appends the spans of a trace with one O_APPEND write, so every worker can share the file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+        self.pid = None
+
+    def __call__(self, data):
+        if self.pid != os.getpid():
+            # Opened lazily so every forked worker gets its own descriptor
+            self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self.pid = os.getpid()
+        os.write(self.fd, data)
+
+
+class UdpExporter:
+    """Sends the spans of a trace to a local collector as one datagram, without waiting"""
+
+    def __init__(self, host, port):
+        self.address = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def __call__(self, data):
+        self.sock.sendto(data, self.address)
+
+
+class Tracer:
+    def __init__(self, service, exporter, sample_rate=0.01):
+        self.service = service
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def start(self, name, traceparent=None):
+        """Trace of one incoming request, or UNSAMPLED.
+
+        With a ``traceparent`` header the caller's sampling decision is kept,
+        otherwise the request is sampled at ``sample_rate``.
+        """
+        parent = parse_traceparent(traceparent) if traceparent else None
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+            return Trace(self, name, trace_id, parent_id) if sampled else UNSAMPLED
+        if random.random() >= self.sample_rate:
+            return UNSAMPLED
+        return Trace(self, name, secrets.token_hex(16))
+
+    def export(self, data):
+        try:
+            self.exporter(data)
+        except OSError:
+            TRACES_EXPORTED.labels('error').inc()
+            return
+        TRACES_EXPORTED.labels('ok').inc()
+
+
+def tracer_from_env(service):
+    """Tracer configured from TRACING_FILE / TRACING_COLLECTOR / TRACING_SAMPLE_RATE, or None when disabled"""
+    path = os.getenv('TRACING_FILE')
+    collector = os.getenv('TRACING_COLLECTOR')
+    if path:
+        exporter = FileExporter(path)
+    elif collector:
+        host, _, port = collector.rpartition(':')
+        exporter = UdpExporter(host or 'localhost', int(port))
+    else:
+        return None
+    return Tracer(service, exporter, sample_rate=float(os.getenv('TRACING_SAMPLE_RATE', 0.01)))
+
+
+def collect(port, path, host='0.0.0.0'):
+    """Local collector: append every span datagram received on ``port`` to ``path``"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, port))
+    with open(path, 'ab', buffering=0) as out:
+        while True:
+            data, _ = sock.recvfrom(65535)
+            out.write(data)
+
+
+if __name__ == '__main__':
+    # python -m serving.tracing [port] [file]
+    collect(int(sys.argv[1]) if len(sys.argv) > 1 else 6831,
+            sys.argv[2] if len(sys.argv) > 2 else 'spans.ndjson')
@@ -0,0 +1,365 @@
+"""Coordinator/worker load generation across processes and hosts.
+
+The coordinator listens on TCP, optionally starts local worker processes,
+and waits until every expected worker has connected. It then hands each
+worker its share of the load plus a common wall-clock start time. Workers
+stream mergeable RunStats deltas back every ``interval`` seconds, and the
+coordinator merges them into one live view and one final report.
+
+Messages are newline-delimited JSON objects with a ``type`` field:
+worker -> coordinator: hello, stats, done, error; coordinator -> worker: start.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+
+from engine import LoadEngine, make_arrivals
+from load_test import LoadTester, add_load_arguments, report_slos
+from results import open_writer
+from stats import RunStats
+
+MAX_MESSAGE = 1 << 24
+START_DELAY = 1.0
+
+
+def encode(message):
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode()
+
+
+def parse_address(value):
+    host, _, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def split_load(config, index, workers):
+    """The share of ``config`` that worker ``index`` of ``workers`` generates"""
+    share = dict(config, index=index, workers=workers)
+    if config['rate'] or config['steps']:
+        if config['rate']:
+            share['rate'] = config['rate'] / workers
+        if config['end_rate'] is not None:
+            share['end_rate'] = config['end_rate'] / workers
+        if config['steps']:
+            share['steps'] = [[rate / workers, duration] for rate, duration in config['steps']]
+        # Interleave the workers' schedules instead of firing in lockstep
+        share['phase'] = index / (config['rate'] or max(rate for rate, _ in config['steps']))
+    else:
+        base, extra = divmod(config['users'], workers)
+        share['users'] = base + (index < extra)
+        share['first_user'] = index * base + min(index, extra)
+    return share
+
+
+class LoadWorker:
+    """Generates one share of the load and hands out stats deltas on demand"""
+
+    def __init__(self, config):
+        self.config = config
+        self.stats = RunStats(config['expected_interval'])
+        self.writer = None
+
+    def record(self, result):
+        self.stats.record(result)
+        self.writer.write(result)
+
+    def take(self):
+        delta, self.stats = self.stats, RunStats(self.config['expected_interval'])
+        return delta
+
+    def load(self, engine):
+        config = self.config
+        if config['rate'] or config['steps']:
+            arrivals = make_arrivals(config['arrival'], config['rate'], config['duration'],
+                                     end_rate=config['end_rate'], steps=config['steps'])
+            return engine.open_loop(config['phase'] + t for t in arrivals)
+        return engine.closed_loop(config['users'], config['operations'], first_user=config['first_user'])
+
+    async def run(self, send):
+        config = self.config
+        engine = LoadEngine(config['url'], self.record, connections=config['connections'],
+                            timeout=config['timeout'])
+        self.writer = open_writer(config['results_dir'], f"{config['scenario']}-w{config['index']}",
+                                  config['format'])
+        try:
+            await asyncio.sleep(max(0.0, config['start_at'] - time.time()))
+            task = asyncio.ensure_future(self.load(engine))
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=config['interval'])
+                await send({'type': 'stats', 'stats': self.take().to_dict()})
+                if done:
+                    task.result()
+                    return self.writer.path
+        finally:
+            self.writer.close()
+
+
+async def run_worker(address, connect_timeout=30.0):
+    host, port = address
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port, limit=MAX_MESSAGE)
+            break
+        except OSError:
+            # The coordinator may not be listening yet
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+    async def send(message):
+        writer.write(encode(message))
+        await writer.drain()
+
+    await send({'type': 'hello', 'host': socket.gethostname(), 'pid': os.getpid()})
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError('Coordinator closed the connection before start')
+    config = json.loads(line)
+    try:
+        results_file = await LoadWorker(config).run(send)
+        await send({'type': 'done', 'results_file': f"{socket.gethostname()}:{results_file}"})
+    except Exception as e:
+        await send({'type': 'error', 'error': str(e) or type(e).__name__})
+        raise
+    finally:
+        writer.close()
+
+
+class WorkersMissing(Exception):
+    """Not every expected worker was connected when the run was due to start"""
+
+
+class Coordinator:
+    def __init__(self, config, local_workers=0, remote_workers=0, listen=('127.0.0.1', 0),
+                 interval=1.0, join_timeout=60.0):
+        self.config = config
+        self.local_workers = local_workers
+        self.expected = local_workers + remote_workers
+        self.listen = listen
+        self.interval = interval
+        self.join_timeout = join_timeout
+
+        self.totals = RunStats(config['expected_interval'])
+        self.window = RunStats()
+        self.workers = []
+        self.results_files = []
+        self.errors = []
+        self.active = 0
+        self.start_at = None
+        self.connections = set()
+
+    async def handle(self, reader, writer):
+        index = None
+        self.connections.add(asyncio.current_task())
+        try:
+            hello = json.loads(await reader.readline())
+            if len(self.workers) >= self.expected:
+                return
+            index = len(self.workers)
+            self.workers.append(hello)
+            self.active += 1
+            print(f"Worker {index} joined from {hello['host']} (pid {hello['pid']})")
+            if len(self.workers) == self.expected:
+                self.joined.set()
+            await self.wait_start(reader)
+            if self.start_at is None:
+                return
+
+            config = split_load(self.config, index, self.expected)
+            writer.write(encode(dict(config, type='start', start_at=self.start_at, interval=self.interval)))
+            await writer.drain()
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError('connection lost')
+                message = json.loads(line)
+                if message['type'] == 'stats':
+                    delta = RunStats.from_dict(message['stats'])
+                    self.totals.merge(delta)
+                    self.window.merge(delta)
+                elif message['type'] == 'done':
+                    self.results_files.append(message['results_file'])
+                    return
+                elif message['type'] == 'error':
+                    raise RuntimeError(message['error'])
+        except Exception as e:
+            self.errors.append(f"worker {index}: {str(e) or type(e).__name__}")
+        finally:
+            self.connections.discard(asyncio.current_task())
+            writer.close()
+            if index is not None:
+                self.active -= 1
+                if self.active == 0 and self.started.is_set():
+                    self.finished.set()
+
+    async def wait_start(self, reader):
+        # A worker sends nothing before its start message, so EOF (or data) here means it left
+        left = asyncio.ensure_future(reader.read(1))
+        started = asyncio.ensure_future(self.started.wait())
+        await asyncio.wait({left, started}, return_when=asyncio.FIRST_COMPLETED)
+        if left.done():
+            started.cancel()
+            raise ConnectionError('left before the run started')
+        left.cancel()
+        # The stream allows one pending read; let the cancellation land before the next one
+        await asyncio.wait({left})
+
+    def print_progress(self, elapsed, window_seconds):
+        window, self.window = self.window, RunStats()
+        rate = window.total_requests / window_seconds if window_seconds > 0 else 0.0
+        print(f"[{elapsed:6.1f}s] workers {self.active}/{self.expected}  "
+              f"requests {self.totals.total_requests}  {rate:.0f} req/s  "
+              f"errors {window.failed_requests}  p99 {window.latency.value_at_percentile(99) * 1000:.2f}ms")
+
+    def join_failure(self, processes):
+        """Report of which workers joined within join_timeout and which are missing"""
+        host = socket.gethostname()
+        joined_pids = {worker['pid'] for worker in self.workers if worker['host'] == host}
+        local_pids = {process.pid for process in processes}
+        lines = [f"Only {self.active} of {self.expected} workers connected at the start "
+                 f"(join timeout {self.join_timeout:g}s)"]
+        for index, worker in enumerate(self.workers):
+            lines.append(f"  joined: worker {index} on {worker['host']} (pid {worker['pid']})")
+        for process in processes:
+            if process.pid not in joined_pids:
+                state = 'still starting' if process.returncode is None else f'exited with code {process.returncode}'
+                lines.append(f"  missing: local worker pid {process.pid}, {state}")
+        remote_joined = sum(1 for worker in self.workers
+                            if worker['host'] != host or worker['pid'] not in local_pids)
+        missing_remote = self.expected - self.local_workers - remote_joined
+        if missing_remote > 0:
+            lines.append(f"  missing: {missing_remote} remote worker(s) never connected")
+        lines.extend(f"  {error}" for error in self.errors)
+        return '\n'.join(lines)
+
+    async def run(self):
+        self.joined = asyncio.Event()
+        self.started = asyncio.Event()
+        self.finished = asyncio.Event()
+        server = await asyncio.start_server(self.handle, *self.listen, limit=MAX_MESSAGE)
+        port = server.sockets[0].getsockname()[1]
+        print(f"Coordinator listening on {self.listen[0]}:{port}, waiting for {self.expected} workers...")
+
+        processes = [
+            await asyncio.create_subprocess_exec(sys.executable, os.path.abspath(__file__), 'worker',
+                                                 '--coordinator', f'127.0.0.1:{port}')
+            for _ in range(self.local_workers)
+        ]
+        try:
+            try:
+                await asyncio.wait_for(self.joined.wait(), self.join_timeout)
+                missing = self.active < self.expected
+            except asyncio.TimeoutError:
+                missing = True
+            if missing:
+                report = self.join_failure(processes)
+                # Release the workers that did join; without start_at they disconnect
+                self.started.set()
+                if self.connections:
+                    await asyncio.wait(self.connections)
+                raise WorkersMissing(report)
+
+            self.start_at = time.time() + START_DELAY
+            self.started.set()
+            last = time.monotonic()
+            while not self.finished.is_set():
+                try:
+                    await asyncio.wait_for(self.finished.wait(), self.interval)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                now = time.monotonic()
+                self.print_progress(time.time() - self.start_at, now - last)
+                last = now
+        finally:
+            server.close()
+            await server.wait_closed()
+            for process in processes:
+                if process.returncode is None and not self.finished.is_set():
+                    process.kill()
+                await process.wait()
+
+        for error in self.errors:
+            print(f"Worker failed: {error}")
+        return self.totals
+
+
+def load_config(args):
+    """The part of the parsed load options that is shipped to workers"""
+    if args.scenario or args.replay:
+        raise SystemExit('Scenario files and trace replay run in load_test.py only')
+    if not (args.rate or args.steps or args.users):
+        raise SystemExit('Distributed runs need --rate or --steps (open loop) or --users (closed loop)')
+    return {
+        'url': args.url,
+        'rate': args.rate,
+        'duration': args.duration,
+        'arrival': args.arrival,
+        'end_rate': args.end_rate,
+        'steps': args.steps,
+        'users': args.users,
+        'operations': args.operations,
+        'connections': args.connections,
+        'timeout': args.timeout,
+        'expected_interval': args.expected_interval,
+        'results_dir': args.results_dir,
+        'format': args.format,
+        'scenario': 'open_loop' if args.rate or args.steps else 'closed_loop'
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Distributed calculator load simulator')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    coordinator = commands.add_parser('coordinator', help='Split the load over workers and report')
+    coordinator.add_argument('--local', type=int, default=0, help='Worker processes to start on this host')
+    coordinator.add_argument('--remote', type=int, default=0, help='Workers expected from other hosts')
+    coordinator.add_argument('--listen', type=parse_address, default=('127.0.0.1', 7000),
+                             help="Address to accept workers on, 'host:port' (0.0.0.0 for remote workers)")
+    coordinator.add_argument('--interval', type=float, default=1.0, help='Seconds between stats updates')
+    coordinator.add_argument('--join-timeout', type=float, default=60.0,
+                             help='Seconds to wait for every worker to connect')
+    add_load_arguments(coordinator)
+
+    worker = commands.add_parser('worker', help='Generate load on behalf of a coordinator')
+    worker.add_argument('--coordinator', type=parse_address, required=True, help="Coordinator 'host:port'")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.command == 'worker':
+        try:
+            asyncio.run(run_worker(args.coordinator))
+        except ConnectionError as e:
+            # Unreachable coordinator, or one that gave up on the run
+            raise SystemExit(f"Worker {os.getpid()}: {e}")
+        sys.exit(0)
+
+    if not args.local and not args.remote:
+        args.local = os.cpu_count() or 1
+    coordinator = Coordinator(load_config(args), local_workers=args.local, remote_workers=args.remote,
+                              listen=args.listen, interval=args.interval, join_timeout=args.join_timeout)
+    try:
+        totals = asyncio.run(coordinator.run())
+    except WorkersMissing as e:
+        raise SystemExit(str(e))
+
+    # Report the merged stats through the regular single-process report
+    tester = LoadTester(args.url, results_dir=args.results_dir)
+    tester.totals = totals
+    tester.scenarios[coordinator.config['scenario']] = {
+        'stats': totals,
+        'results_file': sorted(coordinator.results_files)
+    }
+    tester.print_stats()
+    tester.save_results()
+
+    if coordinator.errors or (args.slo and not report_slos(totals, args.slo)):
+        sys.exit(1)
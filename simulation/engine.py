@@ -0,0 +1,186 @@
+import asyncio
+import math
+import random
+import time
+from datetime import datetime
+
+import aiohttp
+
+OPERATIONS = ['add', 'subtract', 'multiply', 'divide']
+
+
+def random_request():
+    """Random operation data: (operation, num1, num2)"""
+    operation = random.choice(OPERATIONS)
+    num1 = random.uniform(-100, 100)
+    num2 = random.uniform(-50, 50)
+
+    # Avoid division by zero
+    if operation == 'divide' and abs(num2) < 0.1:
+        num2 = 1.0
+    return operation, num1, num2
+
+
+# Arrival schedules. Each yields the intended send time of every request, in
+# seconds from the start of the run, independently of how fast the system
+# under test answers (open-loop load).
+
+def constant_arrivals(rate, duration):
+    interval = 1.0 / rate
+    for i in range(int(rate * duration)):
+        yield i * interval
+
+
+def poisson_arrivals(rate, duration):
+    t = random.expovariate(rate)
+    while t < duration:
+        yield t
+        t += random.expovariate(rate)
+
+
+def step_arrivals(steps):
+    """``steps`` is a list of (rate, duration) phases run one after another"""
+    offset = 0.0
+    for rate, duration in steps:
+        for t in constant_arrivals(rate, duration):
+            yield offset + t
+        offset += duration
+
+
+def ramp_arrivals(start_rate, end_rate, duration):
+    """Rate changing linearly from ``start_rate`` to ``end_rate`` over ``duration``"""
+    slope = (end_rate - start_rate) / duration
+    k = 0
+    while True:
+        # The k-th request is due when the integral of the rate reaches k
+        if slope:
+            t = (-start_rate + math.sqrt(start_rate ** 2 + 2 * slope * k)) / slope
+        else:
+            t = k / start_rate
+        if t >= duration:
+            return
+        yield t
+        k += 1
+
+
+def make_arrivals(arrival, rate, duration, end_rate=None, steps=None):
+    if arrival == 'constant':
+        return constant_arrivals(rate, duration)
+    if arrival == 'poisson':
+        return poisson_arrivals(rate, duration)
+    if arrival == 'ramp':
+        return ramp_arrivals(rate, end_rate if end_rate is not None else rate, duration)
+    if arrival == 'step':
+        return step_arrivals(steps or [(rate, duration)])
+    raise ValueError(f'Unknown arrival schedule: {arrival}')
+
+
+class LoadEngine:
+    """Asyncio load generator sharing one pooled keep-alive HTTP session.
+
+    Every finished request is passed to ``on_result`` as a result dict. The
+    engine runs on one event loop, so ``on_result`` is never called concurrently.
+    ``workload()`` returns the (operation, num1, num2) of each new request.
+    """
+
+    def __init__(self, base_url, on_result, connections=100, timeout=5.0, max_in_flight=10000,
+                 workload=random_request):
+        self.url = f"{base_url}/calculate"
+        self.on_result = on_result
+        self.workload = workload
+        self.connections = connections
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+
+    def _session(self):
+        connector = aiohttp.TCPConnector(limit=self.connections, ttl_dns_cache=300)
+        return aiohttp.ClientSession(connector=connector,
+                                     timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def send(self, session, user_id, operation_id, operation, num1, num2, intended=None):
+        """Send one request and report it.
+
+        ``response_time`` runs from the actual send; ``latency`` runs from
+        ``intended``, the perf_counter time the schedule wanted the request to
+        go out, so time spent behind a stalled generator is not hidden.
+        """
+        start = time.perf_counter()
+        result = {
+            'user_id': user_id,
+            'operation_id': operation_id,
+            'operation': operation,
+            'numbers': (num1, num2)
+        }
+        try:
+            async with session.post(self.url, json={
+                'num1': num1,
+                'num2': num2,
+                'operation': operation
+            }) as response:
+                body = await response.json(content_type=None) if response.status == 200 else None
+            result.update({
+                'status': 'success' if response.status == 200 else 'error',
+                'status_code': response.status,
+                'result': body
+            })
+        except asyncio.TimeoutError:
+            result.update({'status': 'error', 'status_code': 0, 'error': 'Timeout'})
+        except Exception as e:
+            result.update({'status': 'error', 'status_code': 0, 'error': str(e) or type(e).__name__})
+        end = time.perf_counter()
+        # Failures keep their real duration: a timeout took the whole timeout
+        result['response_time'] = end - start
+        result['latency'] = end - (start if intended is None else min(intended, start))
+        result['timestamp'] = datetime.now().isoformat()
+        self.on_result(result)
+
+    async def closed_loop(self, num_users, operations_per_user, think_time=(0.1, 1.0), first_user=0):
+        """Each user sends one request, waits for the answer, thinks, and repeats"""
+        async with self._session() as session:
+            async def user(user_id):
+                for i in range(operations_per_user):
+                    await self.send(session, user_id, i, *self.workload())
+                    # Random delay between operations
+                    await asyncio.sleep(random.uniform(*think_time))
+
+            await asyncio.gather(*(user(first_user + i) for i in range(num_users)))
+
+    async def open_loop(self, arrivals, requests=None):
+        """Send one request at each intended time, whether or not earlier ones have answered.
+
+        ``requests``, when given, supplies the request for each arrival in
+        order (trace replay); otherwise ``workload()`` is called.
+        """
+        loop = asyncio.get_running_loop()
+        tasks = set()
+        async with self._session() as session:
+            start = time.perf_counter()
+            for i, offset in enumerate(arrivals):
+                intended = start + offset
+                delay = intended - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                operation, num1, num2 = next(requests) if requests is not None else self.workload()
+                if len(tasks) >= self.max_in_flight:
+                    # The generator itself is saturated; report it instead of queueing silently
+                    self.on_result({
+                        'user_id': None,
+                        'operation_id': i,
+                        'operation': operation,
+                        'numbers': (num1, num2),
+                        'timestamp': datetime.now().isoformat(),
+                        'response_time': 0,
+                        'latency': time.perf_counter() - intended,
+                        'status': 'error',
+                        'status_code': 0,
+                        'error': 'Too many requests in flight'
+                    })
+                    continue
+
+                task = loop.create_task(self.send(session, None, i, operation, num1, num2, intended))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.gather(*tasks)
@@ -0,0 +1,131 @@
+import math
+from array import array
+
+
+class LatencyHistogram:
+    """Fixed-memory latency histogram in the style of HdrHistogram.
+
+    Values are recorded in whole microseconds between 1 µs and ``highest``
+    seconds. Buckets are log-linear: every power of two is split into enough
+    linear sub-buckets that any recorded value, and therefore any percentile,
+    is reported within ``significant_figures`` decimal digits. Memory does not
+    grow with the number of samples, and histograms merge by adding counts.
+    """
+
+    def __init__(self, highest=60.0, significant_figures=3):
+        self.highest = int(highest * 1_000_000)
+        self.significant_figures = significant_figures
+
+        largest_single_unit = 2 * 10 ** significant_figures
+        self.sub_bucket_count_magnitude = math.ceil(math.log2(largest_single_unit))
+        self.sub_bucket_half_count_magnitude = self.sub_bucket_count_magnitude - 1
+        self.sub_bucket_count = 1 << self.sub_bucket_count_magnitude
+        self.sub_bucket_half_count = self.sub_bucket_count >> 1
+        self.sub_bucket_mask = self.sub_bucket_count - 1
+
+        bucket_count = 1
+        smallest_untrackable = self.sub_bucket_count
+        while smallest_untrackable <= self.highest:
+            smallest_untrackable <<= 1
+            bucket_count += 1
+        self.counts = array('q', bytes(8 * (bucket_count + 1) * self.sub_bucket_half_count))
+
+        self.total_count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value):
+        bucket = (value | self.sub_bucket_mask).bit_length() - self.sub_bucket_count_magnitude
+        sub_bucket = value >> bucket
+        return ((bucket + 1) << self.sub_bucket_half_count_magnitude) + sub_bucket - self.sub_bucket_half_count
+
+    def _highest_equivalent(self, index):
+        bucket = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket < 0:
+            sub_bucket -= self.sub_bucket_half_count
+            bucket = 0
+        return (sub_bucket << bucket) + (1 << bucket) - 1
+
+    def record_value(self, value, count=1):
+        """Record ``count`` samples of ``value`` microseconds"""
+        value = min(max(int(value), 0), self.highest)
+        self.counts[self._index(value)] += count
+        self.total_count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def record(self, seconds):
+        self.record_value(round(seconds * 1_000_000))
+
+    def record_corrected(self, seconds, expected_interval):
+        """Record a sample, back-filling the samples a stalled closed-loop client missed.
+
+        A client that waits ``seconds`` for an answer when it meant to send every
+        ``expected_interval`` seconds skipped the requests that would have queued
+        behind it; they are recorded with the latencies they would have seen.
+        """
+        self.record(seconds)
+        if not expected_interval or expected_interval <= 0:
+            return
+        missing = seconds - expected_interval
+        while missing >= expected_interval:
+            self.record(missing)
+            missing -= expected_interval
+
+    def merge(self, other):
+        if len(other.counts) != len(self.counts):
+            raise ValueError('Histograms with different ranges cannot be merged')
+        counts = self.counts
+        for i, count in enumerate(other.counts):
+            if count:
+                counts[i] += count
+        self.total_count += other.total_count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def value_at_percentile(self, percentile):
+        """Latency in seconds at or below which ``percentile`` % of samples fall"""
+        if not self.total_count:
+            return 0.0
+        target = max(1, math.ceil(percentile / 100 * self.total_count))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._highest_equivalent(i), self.max) / 1_000_000
+        return self.max / 1_000_000
+
+    def mean(self):
+        return self.total / self.total_count / 1_000_000 if self.total_count else 0.0
+
+    def percentiles(self, points=(50, 90, 99, 99.9)):
+        return {f'p{p:g}': self.value_at_percentile(p) for p in points}
+
+    def to_dict(self):
+        """Sparse, JSON-friendly form used to ship histograms between processes"""
+        return {
+            'highest': self.highest / 1_000_000,
+            'significant_figures': self.significant_figures,
+            'counts': [[i, count] for i, count in enumerate(self.counts) if count],
+            'total': self.total,
+            'min': self.min,
+            'max': self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['highest'], data['significant_figures'])
+        for i, count in data['counts']:
+            histogram.counts[i] = count
+            histogram.total_count += count
+        histogram.total = data['total']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        return histogram
@@ -1,10 +1,16 @@
-import requests
-import time
-import random
-import threading
+import argparse
+import asyncio
 import json
+import os
+import sys
 from datetime import datetime
-import logging
+
+from engine import LoadEngine, make_arrivals, random_request
+from results import open_writer
+from scenario import load_scenario, scenario_phases
+from slo import check_slos, parse_slo
+from stats import RunStats
+from traces import replay_schedule
 
 # Configuration
 SERVICES = {
@@ -16,153 +22,213 @@ SERVICES = {
 
 
 class LoadTester:
-    def __init__(self, base_url="http://localhost:5000"):
+    def __init__(self, base_url="http://localhost:5000", connections=100, timeout=5,
+                 results_dir='results', results_format='ndjson', expected_interval=None):
         self.base_url = base_url
-        self.results = []
-        self.operation_counts = {'add': 0, 'subtract': 0, 'multiply': 0, 'divide': 0}
-        self.stats = {
-            'total_requests': 0,
-            'successful_requests': 0,
-            'failed_requests': 0,
-            'total_response_time': 0
-        }
-
-    def simulate_user(self, user_id, num_operations=20):
-        """Simulate a user performing calculator operations"""
-        for i in range(num_operations):
-            # Random operation data
-            operation = random.choice(['add', 'subtract', 'multiply', 'divide'])
-            num1 = random.uniform(-100, 100)
-
-            # Avoid division by zero
-            if operation == 'divide':
-                num2 = random.uniform(-50, 50)
-                if abs(num2) < 0.1:
-                    num2 = 1.0
-            else:
-                num2 = random.uniform(-50, 50)
-
-            # Track operation
-            self.operation_counts[operation] += 1
-
-            # Perform calculation
-            start_time = time.time()
-            try:
-                response = requests.post(
-                    f"{self.base_url}/calculate",
-                    json={
-                        'num1': num1,
-                        'num2': num2,
-                        'operation': operation
-                    },
-                    timeout=5
-                )
-
-                response_time = time.time() - start_time
-
-                result = {
-                    'user_id': user_id,
-                    'operation_id': i,
-                    'operation': operation,
-                    'numbers': (num1, num2),
-                    'timestamp': datetime.now().isoformat(),
-                    'response_time': response_time,
-                    'status': 'success' if response.status_code == 200 else 'error',
-                    'status_code': response.status_code,
-                    'result': response.json() if response.status_code == 200 else None
-                }
-
-                # Update stats
-                self.stats['total_requests'] += 1
-                if response.status_code == 200:
-                    self.stats['successful_requests'] += 1
-                else:
-                    self.stats['failed_requests'] += 1
-                self.stats['total_response_time'] += response_time
-
-            except Exception as e:
-                result = {
-                    'user_id': user_id,
-                    'operation_id': i,
-                    'operation': operation,
-                    'numbers': (num1, num2),
-                    'timestamp': datetime.now().isoformat(),
-                    'response_time': 0,
-                    'status': 'error',
-                    'status_code': 0,
-                    'error': str(e)
-                }
-                self.stats['failed_requests'] += 1
-                self.stats['total_requests'] += 1
-
-            self.results.append(result)
-
-            # Random delay between operations
-            time.sleep(random.uniform(0.1, 1.0))
-
-    def run_simulation(self, num_users=5, operations_per_user=20):
-        """Run simulation with multiple concurrent users"""
-        print(f"Starting simulation with {num_users} users...")
-        threads = []
+        self.connections = connections
+        self.timeout = timeout
+        self.results_dir = results_dir
+        self.results_format = results_format
+        # Closed loop only: send interval a user aims for, used to correct coordinated omission
+        self.expected_interval = expected_interval
+        # Totals across every run of this tester; each run accumulates into its own RunStats
+        self.totals = RunStats()
+        self.run_stats = None
+        self.writer = None
+        self.scenarios = {}
+
+    @property
+    def stats(self):
+        return self.totals.summary()
 
-        for user_id in range(num_users):
-            thread = threading.Thread(
-                target=self.simulate_user,
-                args=(user_id, operations_per_user)
-            )
-            threads.append(thread)
-            thread.start()
+    @property
+    def operation_counts(self):
+        return self.totals.operation_counts
 
-        # Wait for all threads to complete
-        for thread in threads:
-            thread.join()
+    def record(self, result):
+        """Account for one finished request"""
+        self.run_stats.record(result)
+        # Stream the raw result out instead of keeping it in memory
+        self.writer.write(result)
 
-        self.print_stats()
+    def engine(self, workload=None):
+        return LoadEngine(self.base_url, self.record, connections=self.connections,
+                          timeout=self.timeout, workload=workload or random_request)
+
+    def run(self, scenario, load, expected_interval=None, workload=None):
+        """Run one load coroutine factory with fresh local stats, then merge them"""
+        self.run_stats = RunStats(expected_interval)
+        self.writer = open_writer(self.results_dir, scenario, self.results_format)
+        try:
+            asyncio.run(load(self.engine(workload)))
+        finally:
+            self.writer.close()
+
+        run_stats, self.run_stats = self.run_stats, None
+        self.totals.merge(run_stats)
+        self.scenarios[scenario] = {'stats': run_stats, 'results_file': self.writer.path}
+        self.writer = None
+        self.print_stats(run_stats)
         self.save_results()
-        return self.operation_counts
+        return run_stats.operation_counts
+
+    def run_simulation(self, num_users=5, operations_per_user=20, scenario='closed_loop',
+                       workload=None, think_time=(0.1, 1.0)):
+        """Run simulation with multiple concurrent users (closed loop)"""
+        print(f"Starting simulation with {num_users} users...")
+        return self.run(scenario,
+                        lambda engine: engine.closed_loop(num_users, operations_per_user, think_time),
+                        expected_interval=self.expected_interval, workload=workload)
+
+    def run_open_loop(self, rate, duration, arrival='poisson', end_rate=None, steps=None,
+                      scenario='open_loop', workload=None):
+        """Send requests on a fixed arrival schedule regardless of response times"""
+        shape = f"steps {steps}" if arrival == 'step' else f"at {rate} req/s for {duration}s"
+        print(f"Starting open-loop simulation: {arrival} arrivals {shape}...")
+        arrivals = make_arrivals(arrival, rate, duration, end_rate=end_rate, steps=steps)
+        return self.run(scenario, lambda engine: engine.open_loop(arrivals), workload=workload)
 
-    def print_stats(self):
+    def run_replay(self, path, speed=1.0, scenario='replay'):
+        """Replay a recorded trace, keeping its timing, at ``speed`` times real time"""
+        print(f"Replaying {path} at {speed:g}x...")
+        offsets, requests = replay_schedule(path, speed)
+        return self.run(scenario, lambda engine: engine.open_loop(offsets, requests))
+
+    def run_scenario(self, scenario, name='scenario'):
+        """Run every phase of a scenario file in order, each as its own scenario"""
+        counts = {}
+        for phase in scenario_phases(scenario):
+            phase_name = f"{name}-{phase['name']}"
+            print(f"\n--- Phase {phase['name']} ---")
+            if phase.get('users'):
+                counts[phase_name] = self.run_simulation(
+                    phase['users'], phase.get('operations', 20), scenario=phase_name,
+                    workload=phase['workload'], think_time=tuple(phase.get('think_time', (0.1, 1.0))))
+            else:
+                counts[phase_name] = self.run_open_loop(
+                    phase.get('rate'), phase.get('duration', 30), arrival=phase.get('arrival', 'poisson'),
+                    end_rate=phase.get('end_rate'), steps=phase.get('steps'), scenario=phase_name,
+                    workload=phase['workload'])
+        return counts
+
+    def print_stats(self, stats=None):
         """Print simulation statistics"""
+        stats = stats or self.totals
         print("\n=== Simulation Statistics ===")
-        print(f"Total Requests: {self.stats['total_requests']}")
-        print(f"Successful: {self.stats['successful_requests']}")
-        print(f"Failed: {self.stats['failed_requests']}")
+        print(f"Total Requests: {stats.total_requests}")
+        print(f"Successful: {stats.successful_requests}")
+        print(f"Failed: {stats.failed_requests}")
 
-        if self.stats['total_requests'] > 0:
-            success_rate = (self.stats['successful_requests'] / self.stats['total_requests']) * 100
-            avg_response_time = self.stats['total_response_time'] / self.stats['total_requests']
+        if stats.total_requests > 0:
+            success_rate = (stats.successful_requests / stats.total_requests) * 100
+            avg_response_time = stats.total_response_time / stats.total_requests
             print(f"Success Rate: {success_rate:.2f}%")
             print(f"Average Response Time: {avg_response_time:.3f}s")
+            print(f"Latency:      {format_percentiles(stats.latency)}")
+            print(f"Service Time: {format_percentiles(stats.service_time)}")
+
+            print("\nLatency by Operation and Status:")
+            for (op, status), histogram in sorted(stats.breakdown.items()):
+                print(f"  {op:<9} {status:<8} n={stats.outcome_counts[op, status]:<7} "
+                      f"{format_percentiles(histogram)}, max {histogram.max / 1000:.2f}ms")
 
         print("\nOperation Distribution:")
-        for op, count in self.operation_counts.items():
-            percentage = (count / self.stats['total_requests']) * 100
+        for op, count in stats.operation_counts.items():
+            percentage = (count / max(stats.total_requests, 1)) * 100
             print(f"  {op}: {count} ({percentage:.1f}%)")
 
     def save_results(self):
-        """Save results to JSON file for analysis"""
+        """Save aggregated results to JSON file for analysis; raw results are already on disk"""
         with open('simulation_results.json', 'w') as f:
             json.dump({
                 'stats': self.stats,
                 'operation_counts': self.operation_counts,
-                'results': self.results,
+                'latency': self.totals.latency.percentiles(),
+                'histogram': self.totals.latency.to_dict(),
+                'scenarios': {
+                    name: {
+                        'stats': run['stats'].summary(),
+                        'operation_counts': run['stats'].operation_counts,
+                        'latency': run['stats'].latency.percentiles(),
+                        'service_time': run['stats'].service_time.percentiles(),
+                        'breakdown': [
+                            {'operation': op, 'status': status,
+                             'count': run['stats'].outcome_counts[op, status],
+                             'latency': histogram.percentiles()}
+                            for (op, status), histogram in sorted(run['stats'].breakdown.items())
+                        ],
+                        'results_file': run['results_file']
+                    } for name, run in self.scenarios.items()
+                },
                 'timestamp': datetime.now().isoformat()
             }, f, indent=2)
-        print("\nResults saved to simulation_results.json")
+        print(f"\nResults saved to simulation_results.json (raw results in {self.results_dir}/)")
 
 
-if __name__ == '__main__':
-    tester = LoadTester()
+def format_percentiles(histogram):
+    return ", ".join(f"{name} {value * 1000:.2f}ms" for name, value in histogram.percentiles().items())
 
+
+def report_slos(stats, slos):
+    """Print every SLO check; returns True when all of them pass"""
+    print("\n=== SLO Checks ===")
+    passed = True
+    for slo, value, ok in check_slos(stats, slos):
+        passed = passed and ok
+        unit = '' if slo['metric'] == 'error_rate' else 's'
+        print(f"  [{'PASS' if ok else 'FAIL'}] {slo['spec']}: measured {value:.4f}{unit}, "
+              f"threshold {slo['threshold']:.4f}{unit}")
+    return passed
+
+
+def parse_steps(value):
+    """Parse 'rate:duration,rate:duration,...' into step phases"""
+    return [tuple(float(x) for x in step.split(':')) for step in value.split(',')]
+
+
+def add_load_arguments(parser):
+    """Options describing the load to generate, shared with the distributed coordinator"""
+    parser.add_argument('--url', default='http://localhost:5000', help='GUI base URL')
+    parser.add_argument('--scenario', help='Scenario file (TOML, YAML or JSON) with the phases to run')
+    parser.add_argument('--replay', help='Trace file (TRACE_FILE or a results .ndjson) to replay')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay: multiple of real time')
+    parser.add_argument('--users', type=int, help='Closed loop: concurrent users')
+    parser.add_argument('--operations', type=int, default=20, help='Closed loop: operations per user')
+    parser.add_argument('--rate', type=float, help='Open loop: target requests per second')
+    parser.add_argument('--duration', type=float, default=30, help='Open loop: seconds to run')
+    parser.add_argument('--arrival', default='poisson', choices=['constant', 'poisson', 'step', 'ramp'],
+                        help='Open loop: arrival schedule')
+    parser.add_argument('--end-rate', type=float, help='Ramp: rate reached at the end of the run')
+    parser.add_argument('--steps', type=parse_steps, help="Step: phases as 'rate:seconds,...'")
+    parser.add_argument('--connections', type=int, default=100, help='Maximum open connections')
+    parser.add_argument('--timeout', type=float, default=5, help='Request timeout in seconds')
+    parser.add_argument('--results-dir', default='results', help='Directory for per-scenario raw results')
+    parser.add_argument('--format', default='ndjson', choices=['ndjson', 'binary'],
+                        help='Raw results format')
+    parser.add_argument('--expected-interval', type=float,
+                        help='Closed loop: intended seconds between requests of a user, '
+                             'enables coordinated-omission correction')
+    parser.add_argument('--slo', type=parse_slo, action='append', default=[],
+                        help="SLO as '[operation:]metric=threshold', e.g. p99=250ms, "
+                             "divide:p99.9=1s, error_rate=1%%; repeatable")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Calculator load simulator')
+    add_load_arguments(parser)
+    return parser.parse_args()
+
+
+def run_default_scenarios(tester):
     # Run different simulation scenarios
     print("1. Light Load (2 users)")
-    op_counts_light = tester.run_simulation(num_users=2, operations_per_user=10)
+    op_counts_light = dict(tester.run_simulation(num_users=2, operations_per_user=10, scenario='light'))
 
     print("\n2. Medium Load (5 users)")
-    op_counts_medium = tester.run_simulation(num_users=5, operations_per_user=15)
+    op_counts_medium = dict(tester.run_simulation(num_users=5, operations_per_user=15, scenario='medium'))
 
     print("\n3. Heavy Load (10 users)")
-    op_counts_heavy = tester.run_simulation(num_users=10, operations_per_user=20)
+    op_counts_heavy = dict(tester.run_simulation(num_users=10, operations_per_user=20, scenario='heavy'))
 
     # Save combined operation counts for visualization
     combined_counts = {
@@ -171,4 +237,28 @@ if __name__ == '__main__':
         'heavy': op_counts_heavy
     }
     with open('operation_counts.json', 'w') as f:
-        json.dump(combined_counts, f, indent=2)
\ No newline at end of file
+        json.dump(combined_counts, f, indent=2)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    tester = LoadTester(args.url, connections=args.connections, timeout=args.timeout,
+                        results_dir=args.results_dir, results_format=args.format,
+                        expected_interval=args.expected_interval)
+
+    if args.scenario:
+        name = os.path.splitext(os.path.basename(args.scenario))[0]
+        tester.run_scenario(load_scenario(args.scenario), name)
+    elif args.replay:
+        tester.run_replay(args.replay, args.speed)
+    elif args.rate or args.steps:
+        tester.run_open_loop(args.rate, args.duration, arrival=args.arrival,
+                             end_rate=args.end_rate, steps=args.steps)
+    elif args.users:
+        tester.run_simulation(num_users=args.users, operations_per_user=args.operations)
+    else:
+        run_default_scenarios(tester)
+
+    # A breached SLO fails the process so the run can gate a deploy
+    if args.slo and not report_slos(tester.totals, args.slo):
+        sys.exit(1)
@@ -0,0 +1,118 @@
+import json
+import math
+import os
+import struct
+from datetime import datetime
+
+from engine import OPERATIONS
+
+# Binary format: a magic header followed by fixed-size little-endian records
+MAGIC = b'CALCRES1'
+RECORD = struct.Struct('<dddddd iiHB')
+FIELDS = ('timestamp', 'response_time', 'latency', 'num1', 'num2', 'result',
+          'user_id', 'operation_id', 'status_code', 'operation')
+
+EXTENSIONS = {'ndjson': '.ndjson', 'binary': '.bin'}
+
+
+def binary_operand(value):
+    """Operand as a float; NaN when the request did not carry a number, e.g. a replayed invalid input"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class NDJSONWriter:
+    """One compact JSON object per line; keeps every field of the result"""
+
+    def __init__(self, path):
+        self.file = open(path, 'w', buffering=1 << 16)
+
+    def write(self, result):
+        self.file.write(json.dumps(result, separators=(',', ':')) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class BinaryWriter:
+    """Fixed-width 59-byte records, about 5x smaller than NDJSON (~315 bytes a result) and much faster to scan.
+
+    Only the numeric result is kept, not error messages; ``status_code`` 0
+    marks a request that got no HTTP response, and an operand that is not a
+    number is stored as NaN.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'wb', buffering=1 << 16)
+        self.file.write(MAGIC)
+
+    def write(self, result):
+        body = result.get('result')
+        value = body.get('result') if isinstance(body, dict) else None
+        num1, num2 = result['numbers']
+        self.file.write(RECORD.pack(
+            datetime.fromisoformat(result['timestamp']).timestamp(),
+            result['response_time'],
+            result['latency'],
+            binary_operand(num1),
+            binary_operand(num2),
+            math.nan if value is None else value,
+            -1 if result['user_id'] is None else result['user_id'],
+            result['operation_id'],
+            result['status_code'],
+            OPERATIONS.index(result['operation'])
+        ))
+
+    def close(self):
+        self.file.close()
+
+
+def open_writer(directory, scenario, format='ndjson'):
+    """Writer for the results of one scenario, replacing any previous file"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, scenario + EXTENSIONS[format])
+    writer = BinaryWriter(path) if format == 'binary' else NDJSONWriter(path)
+    writer.path = path
+    return writer
+
+
+def _read_binary(path, chunk_records=4096):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a results file')
+        while True:
+            chunk = f.read(RECORD.size * chunk_records)
+            chunk = chunk[:len(chunk) - len(chunk) % RECORD.size]
+            if not chunk:
+                return
+            for record in RECORD.iter_unpack(chunk):
+                row = dict(zip(FIELDS, record))
+                row['timestamp'] = datetime.fromtimestamp(row['timestamp']).isoformat()
+                row['operation'] = OPERATIONS[row['operation']]
+                row['numbers'] = (row.pop('num1'), row.pop('num2'))
+                row['status'] = 'success' if row['status_code'] == 200 else 'error'
+                if row['user_id'] == -1:
+                    row['user_id'] = None
+                # Same shape as the JSON body, minus the fields that are not stored
+                row['result'] = None if math.isnan(row['result']) else {'result': row['result']}
+                yield row
+
+
+def read_results(path):
+    """Lazily yield the results stored in ``path``, one dict at a time.
+
+    Only one chunk is held in memory, so multi-GB runs can be scanned. A
+    truncated last record (from an interrupted run) is skipped.
+    """
+    if path.endswith(EXTENSIONS['binary']):
+        yield from _read_binary(path)
+        return
+    with open(path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                if line.endswith('\n'):
+                    raise
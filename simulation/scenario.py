@@ -0,0 +1,102 @@
+import json
+import random
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from engine import OPERATIONS
+
+# Operand distributions: name -> sampler taking the distribution's parameters
+DISTRIBUTIONS = {
+    'uniform': lambda p: random.uniform(p.get('low', -100), p.get('high', 100)),
+    'normal': lambda p: random.gauss(p.get('mean', 0), p.get('stddev', 1)),
+    'lognormal': lambda p: random.lognormvariate(p.get('mu', 0), p.get('sigma', 1)),
+    'integer': lambda p: random.randint(p.get('low', -100), p.get('high', 100)),
+    'choice': lambda p: random.choice(p['values']),
+    'constant': lambda p: p['value']
+}
+
+DEFAULT_OPERANDS = {
+    'num1': {'distribution': 'uniform', 'low': -100, 'high': 100},
+    'num2': {'distribution': 'uniform', 'low': -50, 'high': 50}
+}
+
+
+class ScenarioError(Exception):
+    pass
+
+
+class Workload:
+    """Draws requests with a weighted operation mix and per-operand distributions"""
+
+    def __init__(self, mix=None, operands=None):
+        mix = mix or {op: 1 for op in OPERATIONS}
+        unknown = set(mix) - set(OPERATIONS)
+        if unknown:
+            raise ScenarioError(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+        self.operations = list(mix)
+        self.weights = [float(mix[op]) for op in self.operations]
+
+        self.operands = dict(DEFAULT_OPERANDS, **(operands or {}))
+        for name, params in self.operands.items():
+            if params.get('distribution') not in DISTRIBUTIONS:
+                raise ScenarioError(f"Unknown distribution for {name}: {params.get('distribution')}")
+
+    def sample(self, name):
+        params = self.operands[name]
+        return DISTRIBUTIONS[params['distribution']](params)
+
+    def __call__(self):
+        operation = random.choices(self.operations, self.weights)[0]
+        num1 = self.sample('num1')
+        num2 = self.sample('num2')
+        # Avoid division by zero
+        if operation == 'divide' and abs(num2) < 0.1:
+            num2 = 1.0
+        return operation, num1, num2
+
+
+def load_scenario(path):
+    """Read a TOML, YAML or JSON scenario file into a dict"""
+    if path.endswith('.toml'):
+        if tomllib is None:
+            raise ScenarioError('TOML scenarios need Python 3.11+ or the tomli package')
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ScenarioError('YAML scenarios need the PyYAML package')
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def scenario_phases(scenario):
+    """Phases of a scenario, each with its own Workload.
+
+    Top-level ``mix`` and ``operands`` apply to every phase unless the phase
+    overrides them. A phase with ``rate`` runs open loop; one with ``users``
+    runs closed loop.
+    """
+    phases = []
+    for i, phase in enumerate(scenario.get('phases') or []):
+        phase = dict(phase)
+        phase.setdefault('name', f'phase{i + 1}')
+        if not phase.get('rate') and not phase.get('users') and phase.get('arrival') != 'step':
+            raise ScenarioError(f"Phase {phase['name']} needs a rate (open loop) or users (closed loop)")
+        phase['workload'] = Workload(phase.get('mix', scenario.get('mix')),
+                                     dict(scenario.get('operands') or {}, **(phase.get('operands') or {})))
+        phases.append(phase)
+    if not phases:
+        raise ScenarioError('Scenario has no phases')
+    return phases
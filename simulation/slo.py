@@ -0,0 +1,63 @@
+import re
+
+SLO_PATTERN = re.compile(r'^(?:(?P<operation>[a-z]+):)?(?P<metric>p[0-9.]+|mean|max|error_rate)'
+                         r'=(?P<threshold>[0-9.]+)(?P<unit>ms|s|%)?$')
+
+
+def parse_slo(spec):
+    """Parse '[operation:]metric=threshold', e.g. 'p99=250ms', 'divide:p99.9=1s', 'error_rate=1%'.
+
+    Latency thresholds default to seconds; error_rate is a fraction unless
+    given with '%'.
+    """
+    match = SLO_PATTERN.match(spec.strip())
+    if not match:
+        raise ValueError(f'Invalid SLO: {spec}')
+    try:
+        threshold = float(match['threshold'])
+        percentile = float(match['metric'][1:]) if match['metric'].startswith('p') else None
+    except ValueError:
+        raise ValueError(f'Invalid SLO: {spec}')
+    # Checked here, so that a bad option fails before the run rather than after it
+    if percentile is not None and not 0 < percentile <= 100:
+        raise ValueError(f'Invalid SLO percentile, expected 0 < p <= 100: {spec}')
+    if match['unit'] == 'ms':
+        threshold /= 1000
+    elif match['unit'] == '%':
+        threshold /= 100
+    return {
+        'spec': spec,
+        'operation': match['operation'],
+        'metric': match['metric'],
+        'threshold': threshold
+    }
+
+
+def measure(stats, operation, metric):
+    if metric == 'error_rate':
+        if operation is None:
+            total, failed = stats.total_requests, stats.failed_requests
+        else:
+            total = failed = 0
+            for (op, status), count in stats.outcome_counts.items():
+                if op == operation:
+                    total += count
+                    if status != '200':
+                        failed += count
+        return failed / total if total else 0.0
+
+    histogram = stats.latency if operation is None else stats.operation_latency(operation)
+    if metric == 'mean':
+        return histogram.mean()
+    if metric == 'max':
+        return histogram.max / 1_000_000
+    return histogram.value_at_percentile(float(metric[1:]))
+
+
+def check_slos(stats, slos):
+    """Evaluate every SLO against ``stats``; returns (slo, measured, passed) tuples"""
+    checks = []
+    for slo in slos:
+        value = measure(stats, slo['operation'], slo['metric'])
+        checks.append((slo, value, value <= slo['threshold']))
+    return checks
@@ -0,0 +1,110 @@
+from histogram import LatencyHistogram
+
+OPERATIONS = ['add', 'subtract', 'multiply', 'divide']
+
+
+def outcome(result):
+    """Status label of a result: the HTTP status code, 'timeout' or 'error'"""
+    if result['status_code']:
+        return str(result['status_code'])
+    return 'timeout' if result.get('error') == 'Timeout' else 'error'
+
+
+class RunStats:
+    """Request counters and latency histogram of one load generator.
+
+    Each worker (event loop, process or host) owns its own RunStats and
+    updates it without locking; totals are built by merging them.
+
+    ``latency`` is measured from the intended send time. For closed-loop runs,
+    ``expected_interval`` additionally corrects it for coordinated omission.
+    ``service_time`` is measured from the actual send. ``breakdown`` holds one
+    latency histogram and ``outcome_counts`` the request count per
+    (operation, outcome).
+    """
+
+    def __init__(self, expected_interval=None):
+        self.expected_interval = expected_interval
+        self.total_requests = 0
+        self.successful_requests = 0
+        self.failed_requests = 0
+        self.total_response_time = 0.0
+        self.operation_counts = {op: 0 for op in OPERATIONS}
+        self.latency = LatencyHistogram()
+        self.service_time = LatencyHistogram()
+        self.breakdown = {}
+        self.outcome_counts = {}
+
+    def record(self, result):
+        self.total_requests += 1
+        if result['status'] == 'success':
+            self.successful_requests += 1
+        else:
+            self.failed_requests += 1
+        self.total_response_time += result['response_time']
+        self.operation_counts[result['operation']] = self.operation_counts.get(result['operation'], 0) + 1
+        latency = result.get('latency', result['response_time'])
+        self.latency.record_corrected(latency, self.expected_interval)
+        self.service_time.record(result['response_time'])
+        key = (result['operation'], outcome(result))
+        if key not in self.breakdown:
+            self.breakdown[key] = LatencyHistogram()
+        self.breakdown[key].record_corrected(latency, self.expected_interval)
+        self.outcome_counts[key] = self.outcome_counts.get(key, 0) + 1
+
+    def merge(self, other):
+        self.total_requests += other.total_requests
+        self.successful_requests += other.successful_requests
+        self.failed_requests += other.failed_requests
+        self.total_response_time += other.total_response_time
+        for op, count in other.operation_counts.items():
+            self.operation_counts[op] = self.operation_counts.get(op, 0) + count
+        self.latency.merge(other.latency)
+        self.service_time.merge(other.service_time)
+        for key, histogram in other.breakdown.items():
+            if key not in self.breakdown:
+                self.breakdown[key] = LatencyHistogram()
+            self.breakdown[key].merge(histogram)
+            self.outcome_counts[key] = self.outcome_counts.get(key, 0) + other.outcome_counts[key]
+        return self
+
+    def operation_latency(self, operation):
+        """Latency histogram of one operation across all outcomes"""
+        histogram = LatencyHistogram()
+        for (op, _), h in self.breakdown.items():
+            if op == operation:
+                histogram.merge(h)
+        return histogram
+
+    def summary(self):
+        """Plain counters, in the shape of the historical ``LoadTester.stats``"""
+        return {
+            'total_requests': self.total_requests,
+            'successful_requests': self.successful_requests,
+            'failed_requests': self.failed_requests,
+            'total_response_time': self.total_response_time
+        }
+
+    def to_dict(self):
+        data = self.summary()
+        data['operation_counts'] = dict(self.operation_counts)
+        data['latency'] = self.latency.to_dict()
+        data['service_time'] = self.service_time.to_dict()
+        data['breakdown'] = [[op, status, self.outcome_counts[op, status], h.to_dict()]
+                             for (op, status), h in self.breakdown.items()]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.total_requests = data['total_requests']
+        stats.successful_requests = data['successful_requests']
+        stats.failed_requests = data['failed_requests']
+        stats.total_response_time = data['total_response_time']
+        stats.operation_counts = dict(data['operation_counts'])
+        stats.latency = LatencyHistogram.from_dict(data['latency'])
+        stats.service_time = LatencyHistogram.from_dict(data['service_time'])
+        for op, status, count, histogram in data['breakdown']:
+            stats.breakdown[op, status] = LatencyHistogram.from_dict(histogram)
+            stats.outcome_counts[op, status] = count
+        return stats
@@ -0,0 +1,44 @@
+import json
+import os
+from datetime import datetime
+
+
+def read_trace(path):
+    """Lazily yield (time, operation, num1, num2) from a trace file, as it was when opened.
+
+    Accepts the GUI's TRACE_FILE output (``t`` in epoch seconds) as well as
+    the simulator's own NDJSON results, whose ``timestamp`` is taken when the
+    response arrived; their time is that minus ``response_time``, the send.
+    Lines appended after opening, such as the requests of a replay going
+    through a GUI that still records into the same TRACE_FILE, are not read.
+    """
+    with open(path, 'rb') as f:
+        remaining = os.fstat(f.fileno()).st_size
+        for line in f:
+            remaining -= len(line)
+            if remaining < 0 or not line.endswith(b'\n'):
+                # Written after the file was opened, or still being written
+                break
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 't' in record:
+                yield record['t'], record['operation'], record['num1'], record['num2']
+            else:
+                num1, num2 = record['numbers']
+                t = datetime.fromisoformat(record['timestamp']).timestamp() - record.get('response_time', 0)
+                yield t, record['operation'], num1, num2
+
+
+def replay_schedule(path, speed=1.0):
+    """Arrival offsets and matching requests that replay ``path`` at ``speed`` times real time.
+
+    The whole trace is read and sorted by send time before the first request
+    goes out: results files list requests in completion order.
+    Returns two iterators to be consumed in lockstep by ``LoadEngine.open_loop``.
+    """
+    records = sorted(read_trace(path), key=lambda record: record[0])
+    start = records[0][0] if records else 0.0
+    offsets = ((t - start) / speed for t, _, _, _ in records)
+    requests = ((operation, num1, num2) for _, operation, num1, num2 in records)
+    return offsets, requests
@@ -0,0 +1,124 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from flask import Flask
+from prometheus_client import CONTENT_TYPE_LATEST
+from redis.exceptions import RedisError
+
+# Make the shared calculator_core and serving packages importable when run from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator_core import json_response, redis_from_env
+from serving import metrics_payload, run
+
+app = Flask(__name__)
+
+# Operation services whose operations:<service> counters are aggregated
+SERVICES = ('addition', 'subtraction', 'multiplication', 'division')
+
+# Rate windows reported by /operations/stats, in seconds
+WINDOWS = {'1m': 60, '5m': 300, '15m': 900}
+
+# Seconds between the background samples the rates are computed from
+SAMPLE_INTERVAL = float(os.getenv('STATS_SAMPLE_INTERVAL', 5))
+
+
+class FleetCounters:
+    """Fleet-wide operation totals from Redis, with rates over WINDOWS.
+
+    Every read is a single MGET of all the counters. Samples taken at least
+    ``sample_interval`` apart are kept for the longest window; a rate is the
+    increase since the oldest sample inside its window, so until the window
+    has filled up it covers the time elapsed so far.
+    """
+
+    def __init__(self, client, services=SERVICES, windows=WINDOWS, sample_interval=SAMPLE_INTERVAL):
+        self.client = client
+        self.services = services
+        self.keys = [f'operations:{service}' for service in services]
+        self.windows = windows
+        self.sample_interval = sample_interval
+        self.samples = deque()
+        self.lock = threading.Lock()
+
+    def read(self):
+        """Current totals as one (monotonic time, counts) sample"""
+        values = self.client.mget(self.keys)
+        return time.monotonic(), tuple(int(value or 0) for value in values)
+
+    def sample(self):
+        now, counts = self.read()
+        with self.lock:
+            if self.samples and any(c < p for c, p in zip(counts, self.samples[-1][1])):
+                # A counter went down: Redis was flushed, older samples are meaningless
+                self.samples.clear()
+            if not self.samples or now - self.samples[-1][0] >= self.sample_interval * 0.9:
+                self.samples.append((now, counts))
+            horizon = now - max(self.windows.values()) - self.sample_interval
+            while len(self.samples) > 1 and self.samples[1][0] <= horizon:
+                self.samples.popleft()
+        return now, counts
+
+    def rates(self, now, counts, seconds):
+        """Per-service operations per second over the last ``seconds``, and the span they cover"""
+        with self.lock:
+            start = next(((t, c) for t, c in self.samples if t >= now - seconds), None)
+        if start is None or now - start[0] <= 0:
+            return [0.0] * len(counts), 0.0
+        elapsed = now - start[0]
+        return [max(current - old, 0) / elapsed for current, old in zip(counts, start[1])], elapsed
+
+    def stats(self):
+        now, counts = self.sample()
+        operations = {service: {'count': count, 'rates': {}} for service, count in zip(self.services, counts)}
+        total = {'count': sum(counts), 'rates': {}}
+        covered = {}
+        for window, seconds in self.windows.items():
+            rates, covered[window] = self.rates(now, counts, seconds)
+            for service, rate in zip(self.services, rates):
+                operations[service]['rates'][window] = rate
+            total['rates'][window] = sum(rates)
+        return {'operations': operations, 'total': total, 'window_seconds': covered, 'timestamp': time.time()}
+
+    def run(self):
+        while True:
+            try:
+                self.sample()
+            except RedisError:
+                pass
+            time.sleep(self.sample_interval)
+
+
+counters = FleetCounters(redis_from_env())
+
+
+@app.route('/operations/stats', methods=['GET'])
+def operation_stats():
+    """Totals and rates of every operation, from one Redis round trip"""
+    try:
+        return json_response(counters.stats())
+    except RedisError as e:
+        return json_response({'error': f'Redis unavailable: {e}'}, 503)
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    return json_response({'status': 'healthy', 'service': 'stats'})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return metrics_payload(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
+
+def start_sampler():
+    thread = threading.Thread(target=counters.run, daemon=True)
+    thread.start()
+
+
+if __name__ == '__main__':
+    # Single worker: the rate samples live in this process's memory
+    run(app, port=5006, workers=1, on_worker_start=start_sampler)
@@ -0,0 +1,285 @@
+"""Real request metrics for the dashboard.
+
+Every operation service exports ``<service>_requests_total``,
+``<service>_errors_total`` and the ``<service>_request_latency_seconds``
+histogram on ``/metrics``. ``ScrapeSource`` reads those endpoints directly
+and turns counter deltas between two scrapes into rates; ``PrometheusSource``
+asks the Prometheus server of ``monitoring/prometheus.yml`` for the same
+figures. Both return, per service and for the whole fleet, the request rate,
+error ratio, mean latency and latency quantiles in seconds.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def quantile_key(q):
+    return f'p{round(q * 100)}'
+
+
+class MetricsParser:
+    """Incremental parser for the Prometheus text exposition format.
+
+    Bytes are fed as they arrive from the network. Only lines whose metric
+    name starts with one of ``prefixes`` are decoded; every other line,
+    including HELP/TYPE comments, is skipped with a single ``startswith``.
+    Samples are collected as ``{(name, labels): value}``.
+    """
+
+    def __init__(self, prefixes):
+        self.prefixes = tuple(prefix.encode() for prefix in prefixes)
+        self.samples = {}
+        self.partial = b''
+
+    def feed(self, chunk):
+        data = self.partial + chunk if self.partial else chunk
+        start = 0
+        while True:
+            end = data.find(b'\n', start)
+            if end < 0:
+                break
+            if data.startswith(self.prefixes, start, end):
+                self._sample(data[start:end])
+            start = end + 1
+        self.partial = data[start:]
+
+    def close(self):
+        if self.partial.startswith(self.prefixes):
+            self._sample(self.partial)
+        self.partial = b''
+        return self.samples
+
+    def _sample(self, line):
+        # name{labels} value [timestamp]
+        brace = line.find(b'{')
+        if brace >= 0:
+            close = line.rfind(b'}')
+            name, labels, rest = line[:brace], line[brace + 1:close], line[close + 1:]
+        else:
+            name, _, rest = line.partition(b' ')
+            labels = b''
+        try:
+            self.samples[name.decode(), labels.decode()] = float(rest.split()[0])
+        except (IndexError, ValueError):
+            pass
+
+
+def label_value(labels, name):
+    key = f'{name}="'
+    start = labels.find(key)
+    if start < 0:
+        return None
+    start += len(key)
+    return labels[start:labels.index('"', start)]
+
+
+def histogram_quantile(q, buckets):
+    """Quantile from cumulative (upper bound, count) buckets, interpolated like PromQL"""
+    if not buckets or buckets[-1][1] <= 0:
+        return None
+    rank = q * buckets[-1][1]
+    lower, lower_count = 0.0, 0.0
+    for upper, count in buckets:
+        if count >= rank:
+            if upper == float('inf'):
+                return lower
+            if count == lower_count:
+                return upper
+            return lower + (upper - lower) * (rank - lower_count) / (count - lower_count)
+        lower, lower_count = upper, count
+    return lower
+
+
+def summarize(rps, errors_per_second, latency_sum, latency_count, quantiles):
+    """Dashboard figures for one window; latencies in seconds"""
+    summary = {
+        'rps': rps,
+        'error_ratio': errors_per_second / rps if rps else 0.0,
+        'mean_latency': latency_sum / latency_count if latency_count else None
+    }
+    summary.update(quantiles)
+    return summary
+
+
+def bucket_quantiles(buckets):
+    return {quantile_key(q): histogram_quantile(q, buckets) for q in QUANTILES}
+
+
+class ScrapeSource:
+    """Reads every service's /metrics directly and derives rates from counter deltas.
+
+    Each collect() compares the new cumulative counters with the previous
+    scrape, so the first call only establishes the baseline. The services
+    are scraped concurrently and one that has not answered after ``timeout``
+    seconds is left out of this round.
+    """
+
+    def __init__(self, endpoints, timeout=2.0):
+        self.endpoints = endpoints
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.executor = ThreadPoolExecutor(max_workers=len(endpoints), thread_name_prefix='scrape')
+        self.previous = {}
+
+    def try_scrape(self, service, endpoint):
+        try:
+            return self.scrape(service, endpoint)
+        except requests.exceptions.RequestException:
+            return None
+
+    def scrape(self, service, endpoint):
+        parser = MetricsParser([f'{service}_requests_total', f'{service}_errors_total',
+                                f'{service}_request_latency_seconds_'])
+        with self.session.get(f'{endpoint}/metrics', timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=16384):
+                parser.feed(chunk)
+        samples = parser.close()
+
+        buckets = sorted(
+            (float(label_value(labels, 'le')), value)
+            for (name, labels), value in samples.items()
+            if name == f'{service}_request_latency_seconds_bucket'
+        )
+        return {
+            'time': time.monotonic(),
+            'requests': samples.get((f'{service}_requests_total', ''), 0.0),
+            'errors': samples.get((f'{service}_errors_total', ''), 0.0),
+            'latency_sum': samples.get((f'{service}_request_latency_seconds_sum', ''), 0.0),
+            'latency_count': samples.get((f'{service}_request_latency_seconds_count', ''), 0.0),
+            'buckets': buckets
+        }
+
+    @staticmethod
+    def delta(old, new):
+        """Counter increase, treating a decrease as a process restart like PromQL does"""
+        if new['requests'] < old['requests'] or new['latency_count'] < old['latency_count']:
+            return {key: value for key, value in new.items() if key != 'time'}
+        old_buckets = dict(old['buckets'])
+        return {
+            'requests': new['requests'] - old['requests'],
+            'errors': max(new['errors'] - old['errors'], 0.0),
+            'latency_sum': new['latency_sum'] - old['latency_sum'],
+            'latency_count': new['latency_count'] - old['latency_count'],
+            'buckets': [(le, count - old_buckets.get(le, 0.0)) for le, count in new['buckets']]
+        }
+
+    def collect(self):
+        """{'services': {name: summary}, 'total': summary, 'requests': {name: total}}, or None"""
+        services = {}
+        totals = {'requests': 0.0, 'errors': 0.0, 'latency_sum': 0.0, 'latency_count': 0.0}
+        total_buckets = {}
+        cumulative = {}
+        seconds = 0.0
+        futures = {service: self.executor.submit(self.try_scrape, service, endpoint)
+                   for service, endpoint in self.endpoints.items()}
+        wait(futures.values(), timeout=self.timeout)
+        for service, future in futures.items():
+            current = future.result() if future.done() else None
+            if current is None:
+                self.previous.pop(service, None)
+                continue
+            cumulative[service] = current['requests']
+            previous, self.previous[service] = self.previous.get(service), current
+            if previous is None:
+                continue
+
+            elapsed = current['time'] - previous['time']
+            d = self.delta(previous, current)
+            services[service] = summarize(d['requests'] / elapsed, d['errors'] / elapsed,
+                                          d['latency_sum'], d['latency_count'], bucket_quantiles(d['buckets']))
+            for key in totals:
+                totals[key] += d[key]
+            seconds = max(seconds, elapsed)
+            for le, count in d['buckets']:
+                total_buckets[le] = total_buckets.get(le, 0.0) + count
+
+        if not services:
+            return None
+        total = summarize(totals['requests'] / seconds, totals['errors'] / seconds,
+                          totals['latency_sum'], totals['latency_count'],
+                          bucket_quantiles(sorted(total_buckets.items())))
+        return {'services': services, 'total': total, 'requests': cumulative}
+
+
+class PrometheusSource:
+    """Asks a Prometheus server (monitoring/prometheus.yml) for the same figures with PromQL.
+
+    Each service has its own metric names, so every figure is one query that
+    evaluates the expression per service, tags the result with a ``service``
+    label and joins them with ``or``.
+    """
+
+    def __init__(self, url, services, window='1m', timeout=2.0):
+        self.url = url.rstrip('/')
+        self.services = list(services)
+        self.window = window
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def query(self, expression):
+        """Instant query, as {service label: value}; NaN results are dropped"""
+        response = self.session.get(f'{self.url}/api/v1/query', params={'query': expression},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        values = {}
+        for item in response.json()['data']['result']:
+            value = float(item['value'][1])
+            if value == value:
+                values[item['metric'].get('service', '')] = value
+        return values
+
+    def per_service(self, template):
+        return ' or '.join(
+            f'label_replace({template.format(service=service, window=self.window)}, '
+            f'"service", "{service}", "", "")'
+            for service in self.services
+        )
+
+    def collect(self):
+        """Same shape as ScrapeSource.collect(), or None when Prometheus has no data"""
+        try:
+            rps = self.query(self.per_service('sum(rate({service}_requests_total[{window}]))'))
+            if not rps:
+                return None
+            errors = self.query(self.per_service('sum(rate({service}_errors_total[{window}]))'))
+            latency_sum = self.query(self.per_service('sum(rate({service}_request_latency_seconds_sum[{window}]))'))
+            latency_count = self.query(
+                self.per_service('sum(rate({service}_request_latency_seconds_count[{window}]))'))
+            requests_total = self.query(self.per_service('sum({service}_requests_total)'))
+
+            buckets = self.per_service('rate({service}_request_latency_seconds_bucket[{window}])')
+            quantiles = {}
+            for q in QUANTILES:
+                quantiles[quantile_key(q)] = self.query(
+                    self.per_service(f'histogram_quantile({q}, sum by (le) '
+                                     '(rate({service}_request_latency_seconds_bucket[{window}])))'))
+                quantiles[quantile_key(q)].update(
+                    {'': value for value in self.query(f'histogram_quantile({q}, sum by (le) ({buckets}))').values()})
+        except (requests.exceptions.RequestException, KeyError, ValueError):
+            return None
+
+        def summary(key, rate, error_rate, latency, count):
+            return summarize(rate, error_rate, latency, count,
+                             {name: values.get(key) for name, values in quantiles.items()})
+
+        services = {
+            service: summary(service, rps[service], errors.get(service, 0.0),
+                             latency_sum.get(service, 0.0), latency_count.get(service, 0.0))
+            for service in self.services if service in rps
+        }
+        total = summary('', sum(rps.values()), sum(errors.values()),
+                        sum(latency_sum.values()), sum(latency_count.values()))
+        return {'services': services, 'total': total, 'requests': requests_total}
+
+
+def source_from_env(endpoints, timeout=2.0):
+    """PrometheusSource when METRICS_SOURCE=prometheus, otherwise direct scraping"""
+    if os.getenv('METRICS_SOURCE', 'scrape') == 'prometheus':
+        return PrometheusSource(os.getenv('PROMETHEUS_URL', 'http://localhost:9090'), endpoints,
+                                window=os.getenv('PROMETHEUS_WINDOW', '1m'), timeout=timeout)
+    return ScrapeSource(endpoints, timeout=timeout)
@@ -0,0 +1,105 @@
+"""Concurrent health and operation-count probes for the dashboard.
+
+``ServiceProber.probe`` issues ``/health`` for every service, plus one call
+to the stats service for the fleet-wide operation counts, at once over a
+pooled keep-alive session and returns whatever has answered when the cycle
+deadline expires, so one hung service cannot delay the others.
+``fixed_rate`` paces the collection loop on an absolute schedule that does
+not drift with the time each cycle takes.
+"""
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Every service gets the health probe, the stats service the count probe
+HEALTH_PATH = '/health'
+COUNT_PATH = '/operations/stats'
+
+
+def fixed_rate(interval, stopped, clock=time.monotonic):
+    """Yield tick times ``start + n * interval`` until ``stopped`` is set.
+
+    Waiting is relative to the schedule, not to the end of the previous
+    cycle. Ticks that were missed because a cycle overran are skipped
+    rather than fired back to back.
+    """
+    tick = clock()
+    while not stopped.is_set():
+        yield tick
+        tick += interval
+        now = clock()
+        if now > tick:
+            tick += math.ceil((now - tick) / interval) * interval
+        stopped.wait(tick - now)
+
+
+class ServiceProber:
+    def __init__(self, endpoints, stats_url=None, deadline=2.5):
+        self.endpoints = endpoints
+        self.stats_url = stats_url.rstrip('/') if stats_url else None
+        self.deadline = deadline
+        # One thread per probe plus one for the extra task of probe()
+        size = len(endpoints) + 2
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='probe')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(endpoints) + 1, pool_maxsize=1, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _probe(self, url):
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, timeout=self.deadline)
+            outcome = response.status_code, response.json() if response.status_code == 200 else None
+        except (requests.exceptions.RequestException, ValueError):
+            outcome = None
+        return outcome, time.perf_counter() - start
+
+    def probe(self, extra=None):
+        """Probe every service concurrently and wait at most ``deadline`` seconds.
+
+        ``extra`` is an optional callable run in the same cycle, e.g. the
+        metrics scrape. Returns ``(health, fleet, durations, extra_result)``:
+        health is 'healthy', 'unhealthy', 'unreachable' or 'timeout' per
+        service, fleet the stats service's /operations/stats body or None,
+        durations are seconds per service and probe ('health', or 'count'
+        under 'stats'), None for probes still running at the deadline.
+        """
+        futures = {
+            self.executor.submit(self._probe, f'{endpoint}{HEALTH_PATH}'): (service, 'health')
+            for service, endpoint in self.endpoints.items()
+        }
+        if self.stats_url:
+            futures[self.executor.submit(self._probe, f'{self.stats_url}{COUNT_PATH}')] = ('stats', 'count')
+        extra_future = self.executor.submit(extra) if extra else None
+        waiting = list(futures) + ([extra_future] if extra_future else [])
+        wait(waiting, timeout=self.deadline)
+
+        health = {}
+        fleet = None
+        durations = {service: {probe: None} for service, probe in futures.values()}
+        for future, (service, probe) in futures.items():
+            if not future.done():
+                if probe == 'health':
+                    health[service] = 'timeout'
+                continue
+            outcome, durations[service][probe] = future.result()
+            if probe == 'health':
+                if outcome is None:
+                    health[service] = 'unreachable'
+                else:
+                    health[service] = 'healthy' if outcome[0] == 200 else 'unhealthy'
+            elif outcome is not None:
+                fleet = outcome[1]
+
+        extra_result = None
+        if extra_future is not None and extra_future.done() and extra_future.exception() is None:
+            extra_result = extra_future.result()
+        return health, fleet, durations, extra_result
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,77 @@
+"""Server-sent events for the dashboard.
+
+The collector publishes one update per cycle. ``Broadcaster.publish``
+serializes it once into an SSE frame and every subscribed stream sends the
+same bytes, so the cost per tick does not grow with the payload times the
+number of clients. The last few frames are kept so that a slow client, or one
+reconnecting with ``Last-Event-ID``, can catch up; a client that fell further
+behind gets a ``reset`` event and reloads the full snapshot from /api/metrics.
+"""
+import json
+import threading
+from collections import deque
+
+# Seconds of silence after which a comment line keeps proxies from closing the stream
+HEARTBEAT_INTERVAL = 15.0
+
+
+class Broadcaster:
+    def __init__(self, backlog=32):
+        self.condition = threading.Condition()
+        self.frames = deque(maxlen=backlog)
+        self.sequence = 0
+        self.subscribers = 0
+        self.closed = False
+
+    def publish(self, event, payload):
+        """Serialize ``payload`` once and wake every subscriber"""
+        with self.condition:
+            self.sequence += 1
+            data = json.dumps(payload, separators=(',', ':'))
+            self.frames.append((self.sequence, f'id: {self.sequence}\nevent: {event}\ndata: {data}\n\n'.encode()))
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def _pending(self, last_id):
+        """Frames after ``last_id``, or None when some of them were already dropped"""
+        if not self.frames or last_id >= self.sequence:
+            return []
+        if last_id < self.frames[0][0] - 1:
+            return None
+        return [frame for sequence, frame in self.frames if sequence > last_id]
+
+    def stream(self, last_id=None):
+        """Generator of SSE bytes for one client, starting after event ``last_id``.
+
+        Without ``last_id`` the client has just loaded the snapshot and only
+        gets updates published from now on.
+        """
+        with self.condition:
+            self.subscribers += 1
+            if last_id is None or last_id > self.sequence:
+                last_id = self.sequence
+        try:
+            yield b'retry: 3000\n\n'
+            while True:
+                with self.condition:
+                    frames = self._pending(last_id)
+                    if frames == [] and not self.closed:
+                        self.condition.wait(HEARTBEAT_INTERVAL)
+                        frames = self._pending(last_id)
+                    if self.closed:
+                        return
+                    sequence = self.sequence
+                if frames is None:
+                    yield f'id: {sequence}\nevent: reset\ndata: {{}}\n\n'.encode()
+                elif frames:
+                    yield b''.join(frames)
+                else:
+                    yield b': heartbeat\n\n'
+                last_id = sequence
+        finally:
+            with self.condition:
+                self.subscribers -= 1
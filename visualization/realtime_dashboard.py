@@ -1,10 +1,23 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST
+import hashlib
 import json
+import os
+import sys
 import time
 import threading
-import requests
 from datetime import datetime
-import random
+
+# Make the shared serving package importable when run from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator_core import read_recent_operations, redis_from_env
+from redis.exceptions import RedisError, ResponseError
+from serving import metrics_payload, run
+from metrics_source import source_from_env
+from probes import ServiceProber, fixed_rate
+from push import Broadcaster
+from timeseries import RESOLUTIONS, TimeSeriesStore
 
 app = Flask(__name__)
 
@@ -16,99 +29,193 @@ SERVICE_ENDPOINTS = {
     'division': 'http://localhost:5004'
 }
 
+# Stats service with the fleet-wide operation counts and rates, read once per cycle
+STATS_SERVICE = os.getenv('STATS_SERVICE', 'http://localhost:5006')
+
+# Seconds between collection cycles, and how long one cycle may wait for the services
+POLL_INTERVAL = float(os.getenv('DASHBOARD_POLL_INTERVAL', 3))
+POLL_DEADLINE = float(os.getenv('DASHBOARD_POLL_DEADLINE', 2.5))
+
+# Chart series kept in the history store
+SERIES = ('requests_per_second', 'response_times', 'error_rates', 'p95_latency', 'p99_latency', 'probe_times')
+# Optional directory of memory-mapped history files that survive a restart
+HISTORY_DIR = os.getenv('DASHBOARD_HISTORY_DIR')
+
+PROBE_DURATION = Histogram('dashboard_probe_duration_seconds', 'Duration of the dashboard probes of each service',
+                           ['service', 'probe'])
+PROBE_TIMEOUTS = Counter('dashboard_probe_timeouts_total', 'Probes still running at the cycle deadline',
+                         ['service', 'probe'])
+
+
+class Snapshot:
+    """/api/metrics body of one collection cycle, never modified once published"""
+    __slots__ = ('body', 'etag', 'event_id')
+
+    def __init__(self, payload, event_id):
+        self.body = json.dumps(payload, separators=(',', ':')).encode()
+        self.etag = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        self.event_id = event_id
+
 
 class DataCollector:
-    def __init__(self):
-        self.running = True
+    def __init__(self, source=None, history_dir=HISTORY_DIR):
+        self.stopped = threading.Event()
+        # The scrape runs inside the probe cycle, so it has to give up a little earlier
+        self.source = source or source_from_env(SERVICE_ENDPOINTS, timeout=POLL_DEADLINE * 0.8)
+        self.prober = ServiceProber(SERVICE_ENDPOINTS, stats_url=STATS_SERVICE, deadline=POLL_DEADLINE)
+        self.history = TimeSeriesStore(SERIES, POLL_INTERVAL, history_dir)
+        self.broadcaster = Broadcaster()
         self.metrics_data = {
-            'requests_per_second': [],
-            'response_times': [],
-            'error_rates': [],
-            'operation_distribution': {'add': 0, 'subtract': 0, 'multiply': 0, 'divide': 0},
+            'probe_durations': {},
+            'latency_percentiles': {},
+            'services': {},
+            'operation_distribution': {service: 0 for service in SERVICE_ENDPOINTS},
+            'operation_rates': {},
             'service_health': {service: 'unknown' for service in SERVICE_ENDPOINTS.keys()}
         }
         self.operation_history = []
+        # Replaced, never mutated: readers on other threads always see one complete cycle
+        self.snapshot = self.take_snapshot(self.current_stats())
 
     def collect_operation_data(self):
-        """Collect real operation data from services"""
-        while self.running:
+        """Collect real operation data from services, once per POLL_INTERVAL"""
+        # Timestamps follow the schedule, not the moment each cycle happened to finish
+        wall_offset = time.time() - time.monotonic()
+        for tick in fixed_rate(POLL_INTERVAL, self.stopped):
             try:
-                # Try to get operation counts from each service
-                operation_counts = {'add': 0, 'subtract': 0, 'multiply': 0, 'divide': 0}
-
-                for service, endpoint in SERVICE_ENDPOINTS.items():
-                    try:
-                        # Get service health
-                        health_response = requests.get(f"{endpoint}/health", timeout=2)
-                        self.metrics_data['service_health'][
-                            service] = 'healthy' if health_response.status_code == 200 else 'unhealthy'
-
-                        # Get operation count (if endpoint exists)
-                        count_response = requests.get(f"{endpoint}/operations/count", timeout=2)
-                        if count_response.status_code == 200:
-                            data = count_response.json()
-                            operation_name = data['operation']
-                            operation_counts[operation_name] = data['count']
-
-                    except requests.exceptions.RequestException:
-                        self.metrics_data['service_health'][service] = 'unreachable'
-
-                # If no real data, use simulated data
-                if sum(operation_counts.values()) == 0:
-                    operation_counts = self.generate_simulated_operations()
+                timestamp = tick + wall_offset
+                health, fleet, durations, metrics = self.prober.probe(extra=self.source.collect)
+                previous_health = dict(self.metrics_data['service_health'])
+                previous_counts = self.metrics_data['operation_distribution']
+
+                self.metrics_data['service_health'].update(health)
+                self.record_probes(timestamp, durations)
+
+                operation_counts = {service: 0 for service in SERVICE_ENDPOINTS}
+                if fleet:
+                    operations = fleet['operations']
+                    operation_counts.update({service: figures['count'] for service, figures in operations.items()})
+                    self.metrics_data['operation_rates'] = {
+                        service: figures['rates'] for service, figures in operations.items()
+                    }
+                # Without Redis the request counters are the best count we have
+                if sum(operation_counts.values()) == 0 and metrics:
+                    operation_counts.update({service: int(count) for service, count in metrics['requests'].items()})
 
                 self.metrics_data['operation_distribution'] = operation_counts
 
-                # Generate realistic metrics based on operations
-                total_ops = sum(operation_counts.values())
-                current_rps = min(total_ops % 20 + random.randint(1, 10), 30)  # Simulate varying load
-                avg_response_time = 0.1 + (current_rps / 100)  # Response time increases with load
-                error_rate = max(0, random.gauss(2, 1))  # Around 2% error rate
-
-                current_time = datetime.now()
-
-                # Update metrics
-                self.metrics_data['requests_per_second'].append({
-                    'time': current_time.isoformat(),
-                    'value': current_rps
-                })
+                if metrics:
+                    self.record(timestamp, metrics)
 
-                self.metrics_data['response_times'].append({
-                    'time': current_time.isoformat(),
-                    'value': avg_response_time * 1000  # Convert to ms
-                })
-
-                self.metrics_data['error_rates'].append({
-                    'time': current_time.isoformat(),
-                    'value': error_rate
-                })
-
-                # Keep only last 50 data points
-                for key in ['requests_per_second', 'response_times', 'error_rates']:
-                    if len(self.metrics_data[key]) > 50:
-                        self.metrics_data[key] = self.metrics_data[key][-50:]
+                stats = self.current_stats()
+                self.publish(timestamp, previous_health, previous_counts, stats)
+                self.snapshot = self.take_snapshot(stats)
 
             except Exception as e:
                 print(f"Error collecting data: {e}")
 
-            time.sleep(3)  # Collect every 3 seconds
-
-    def generate_simulated_operations(self):
-        """Generate realistic operation distribution"""
-        # Realistic distribution - addition is most common
-        base_counts = {
-            'add': random.randint(40, 60),
-            'subtract': random.randint(20, 35),
-            'multiply': random.randint(15, 25),
-            'divide': random.randint(10, 20)
+    def record_probes(self, timestamp, durations):
+        """Probe durations in ms; the slowest probe of each cycle becomes a time series"""
+        latest = {}
+        for service, probes in durations.items():
+            latest[service] = {}
+            for probe, seconds in probes.items():
+                if seconds is None:
+                    PROBE_TIMEOUTS.labels(service, probe).inc()
+                    latest[service][probe] = None
+                    continue
+                PROBE_DURATION.labels(service, probe).observe(seconds)
+                latest[service][probe] = round(seconds * 1000, 2)
+        self.metrics_data['probe_durations'] = latest
+
+        slowest = [value if value is not None else POLL_DEADLINE * 1000
+                   for probes in latest.values() for value in probes.values()]
+        self.history.append('probe_times', timestamp, max(slowest, default=0))
+
+    def record(self, timestamp, metrics):
+        """Append one window of real metrics to the chart series"""
+        total = metrics['total']
+
+        # Update metrics
+        self.history.append('requests_per_second', timestamp, total['rps'])
+        self.history.append('response_times', timestamp, (total['mean_latency'] or 0) * 1000)  # Convert to ms
+        self.history.append('error_rates', timestamp, total['error_ratio'] * 100)
+        for key in ('p95', 'p99'):
+            if total[key] is not None:
+                self.history.append(f'{key}_latency', timestamp, total[key] * 1000)
+
+        self.metrics_data['latency_percentiles'] = {
+            key: round(value * 1000, 2) for key, value in total.items()
+            if key.startswith('p') and value is not None
         }
-        return base_counts
+        self.metrics_data['services'] = metrics['services']
+
+    def publish(self, timestamp, previous_health, previous_counts, stats):
+        """Push the points of this cycle, and only what changed besides them, to the stream"""
+        update = {'points': {}}
+        for name in SERIES:
+            points = self.history[name].tail(1)
+            if points and points[0][0] == timestamp:
+                update['points'][name] = {'time': datetime.fromtimestamp(timestamp).isoformat(),
+                                          'value': points[0][1]}
+        health = {service: status for service, status in self.metrics_data['service_health'].items()
+                  if previous_health.get(service) != status}
+        if health:
+            update['service_health'] = health
+        if self.metrics_data['operation_distribution'] != previous_counts:
+            update['operation_distribution'] = self.metrics_data['operation_distribution']
+            update['operation_rates'] = self.metrics_data['operation_rates']
+        update['latency_percentiles'] = self.metrics_data['latency_percentiles']
+        update.update(stats)
+        self.broadcaster.publish('update', update)
+
+    def current_stats(self):
+        """Headline figures of the stat cards"""
+        history = self.history
+        current_rps = history['requests_per_second'].last() or 0
+        response_times = [value for _, value in history['response_times'].tail(20)]
+        avg_response_time = sum(response_times) / len(response_times) if response_times else 0
+        error_rate = history['error_rates'].last() or 0
+        return {
+            'current_rps': round(current_rps, 1),
+            'avg_response_time': round(avg_response_time, 1),
+            'error_rate': round(error_rate, 1),
+            'total_operations': sum(self.metrics_data['operation_distribution'].values())
+        }
+
+    def take_snapshot(self, stats):
+        """Serialize the state after this cycle, tagged with the stream event that carried it"""
+        metrics_data = self.metrics_data
+        event_id = self.broadcaster.sequence
+        return Snapshot({
+            # Updates after this one are picked up by /api/stream?last_id=<event_id>
+            'event_id': event_id,
+            'requests_per_second': self.recent('requests_per_second'),
+            'response_times': self.recent('response_times'),
+            'error_rates': self.recent('error_rates'),
+            'operation_distribution': metrics_data['operation_distribution'],
+            'operation_rates': metrics_data['operation_rates'],
+            'service_health': metrics_data['service_health'],
+            'latency_percentiles': metrics_data['latency_percentiles'],
+            'probe_times': self.recent('probe_times'),
+            'probe_durations': metrics_data['probe_durations'],
+            'services': metrics_data['services'],
+            **stats
+        }, event_id)
 
     def get_metrics(self):
         return self.metrics_data
 
+    def recent(self, name, count=20):
+        """The newest raw points of a series, as chart points"""
+        return [{'time': datetime.fromtimestamp(t).isoformat(), 'value': v}
+                for t, v in self.history[name].tail(count)]
+
     def stop(self):
-        self.running = False
+        self.stopped.set()
+        self.prober.close()
+        self.broadcaster.close()
+        self.history.flush()
 
 
 # Initialize data collector
@@ -334,59 +441,68 @@ def dashboard():
                 }
             });
 
-            // Update dashboard data
+            let state = null;
+
+            function render() {
+                // Update stats
+                document.getElementById('statsGrid').innerHTML = `
+                    <div class="stat-card">
+                        <div class="stat-value">${state.current_rps}</div>
+                        <div class="stat-label">Current RPS</div>
+                    </div>
+                    <div class="stat-card">
+                        <div class="stat-value">${state.avg_response_time}</div>
+                        <div class="stat-label">Avg Response Time (ms)</div>
+                        <div class="stat-label">p95 ${state.latency_percentiles.p95 ?? '-'} / p99 ${state.latency_percentiles.p99 ?? '-'}</div>
+                    </div>
+                    <div class="stat-card">
+                        <div class="stat-value">${state.error_rate}%</div>
+                        <div class="stat-label">Error Rate</div>
+                    </div>
+                    <div class="stat-card">
+                        <div class="stat-value">${state.total_operations}</div>
+                        <div class="stat-label">Total Operations</div>
+                    </div>
+                `;
+
+                // Update health status
+                let healthHTML = '';
+                for (const [service, status] of Object.entries(state.service_health)) {
+                    const statusClass = status === 'healthy' ? 'healthy' : 
+                                      status === 'unhealthy' ? 'unhealthy' : 'unknown';
+                    healthHTML += `
+                        <div class="health-item">
+                            <span class="health-dot ${statusClass}"></span>
+                            ${service}: ${status}
+                        </div>
+                    `;
+                }
+                document.getElementById('healthStatus').innerHTML = healthHTML;
+
+                // Update operation distribution with real data
+                const opData = state.operation_distribution;
+                operationChart.data.datasets[0].data = [
+                    opData.addition,
+                    opData.subtraction,
+                    opData.multiplication,
+                    opData.division
+                ];
+                operationChart.update();
+            }
+
+            // Full snapshot, on first load and whenever the stream asks for a reset
             function updateDashboard() {
-                fetch('/api/metrics')
+                return fetch('/api/metrics')
                     .then(response => response.json())
                     .then(data => {
-                        // Update stats
-                        document.getElementById('statsGrid').innerHTML = `
-                            <div class="stat-card">
-                                <div class="stat-value">${data.current_rps}</div>
-                                <div class="stat-label">Current RPS</div>
-                            </div>
-                            <div class="stat-card">
-                                <div class="stat-value">${data.avg_response_time}</div>
-                                <div class="stat-label">Avg Response Time</div>
-                            </div>
-                            <div class="stat-card">
-                                <div class="stat-value">${data.error_rate}%</div>
-                                <div class="stat-label">Error Rate</div>
-                            </div>
-                            <div class="stat-card">
-                                <div class="stat-value">${data.total_operations}</div>
-                                <div class="stat-label">Total Operations</div>
-                            </div>
-                        `;
-
-                        // Update health status
-                        let healthHTML = '';
-                        for (const [service, status] of Object.entries(data.service_health)) {
-                            const statusClass = status === 'healthy' ? 'healthy' : 
-                                              status === 'unhealthy' ? 'unhealthy' : 'unknown';
-                            healthHTML += `
-                                <div class="health-item">
-                                    <span class="health-dot ${statusClass}"></span>
-                                    ${service}: ${status}
-                                </div>
-                            `;
-                        }
-                        document.getElementById('healthStatus').innerHTML = healthHTML;
+                        state = data;
+                        render();
 
                         // Update charts
                         updateChart(rpsChart, data.requests_per_second);
                         updateChart(responseTimeChart, data.response_times);
                         updateChart(errorRateChart, data.error_rates);
-
-                        // Update operation distribution with real data
-                        const opData = data.operation_distribution;
-                        operationChart.data.datasets[0].data = [
-                            opData.add,
-                            opData.subtract, 
-                            opData.multiply,
-                            opData.divide
-                        ];
-                        operationChart.update();
+                        return data;
                     })
                     .catch(error => {
                         console.error('Error fetching metrics:', error);
@@ -404,9 +520,46 @@ def dashboard():
                 }
             }
 
-            // Update every 3 seconds
-            setInterval(updateDashboard, 3000);
-            updateDashboard(); // Initial load
+            function appendPoint(chart, point) {
+                if (!point) {
+                    return;
+                }
+                chart.data.labels.push(new Date(point.time).toLocaleTimeString());
+                chart.data.datasets[0].data.push(point.value);
+                if (chart.data.labels.length > 20) {
+                    chart.data.labels.shift();
+                    chart.data.datasets[0].data.shift();
+                }
+                chart.update();
+            }
+
+            // An update carries the new points and only the health states that changed
+            function applyUpdate(update) {
+                Object.assign(state.service_health, update.service_health || {});
+                for (const key of ['operation_distribution', 'latency_percentiles', 'current_rps',
+                                   'avg_response_time', 'error_rate', 'total_operations']) {
+                    if (key in update) {
+                        state[key] = update[key];
+                    }
+                }
+                render();
+                appendPoint(rpsChart, update.points.requests_per_second);
+                appendPoint(responseTimeChart, update.points.response_times);
+                appendPoint(errorRateChart, update.points.error_rates);
+            }
+
+            if (window.EventSource) {
+                updateDashboard().then(data => {
+                    const lastId = data ? data.event_id : '';
+                    const source = new EventSource(`/api/stream?last_id=${lastId}`);
+                    source.addEventListener('update', event => applyUpdate(JSON.parse(event.data)));
+                    source.addEventListener('reset', () => updateDashboard());
+                });
+            } else {
+                // Update every 3 seconds
+                setInterval(updateDashboard, 3000);
+                updateDashboard(); // Initial load
+            }
         </script>
     </body>
     </html>
@@ -415,27 +568,69 @@ def dashboard():
 
 @app.route('/api/metrics')
 def get_metrics():
-    """API endpoint for metrics data"""
-    metrics_data = data_collector.get_metrics()
-
-    # Calculate current stats
-    current_rps = metrics_data['requests_per_second'][-1]['value'] if metrics_data['requests_per_second'] else 0
-    response_times = [d['value'] for d in metrics_data['response_times']]
-    avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-    error_rate = metrics_data['error_rates'][-1]['value'] if metrics_data['error_rates'] else 0
-    total_operations = sum(metrics_data['operation_distribution'].values())
-
-    return jsonify({
-        'requests_per_second': metrics_data['requests_per_second'][-20:],
-        'response_times': metrics_data['response_times'][-20:],
-        'error_rates': metrics_data['error_rates'][-20:],
-        'operation_distribution': metrics_data['operation_distribution'],
-        'service_health': metrics_data['service_health'],
-        'current_rps': round(current_rps, 1),
-        'avg_response_time': round(avg_response_time, 1),
-        'error_rate': round(error_rate, 1),
-        'total_operations': total_operations
-    })
+    """API endpoint for metrics data: the latest cycle's pre-serialized snapshot"""
+    snapshot = data_collector.snapshot
+    response = Response(snapshot.body, mimetype='application/json', headers={'Cache-Control': 'no-cache'})
+    response.set_etag(snapshot.etag)
+    return response.make_conditional(request)
+
+
+@app.route('/api/stream')
+def stream():
+    """Server-sent events with the points and changes of every collection cycle"""
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        last_id = None
+    return Response(data_collector.broadcaster.stream(last_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+recent_client = None
+
+
+@app.route('/api/recent_operations')
+def get_recent_operations():
+    """Operations recorded since the stream IDs given per service, e.g. ?addition=1700000000000-0"""
+    global recent_client
+    if recent_client is None:
+        recent_client = redis_from_env(decode_responses=False)
+    last_ids = {service: request.args[service] for service in SERVICE_ENDPOINTS if request.args.get(service)}
+    try:
+        count = min(int(request.args.get('count', 100)), 1000)
+        operations, last_ids = read_recent_operations(recent_client, list(SERVICE_ENDPOINTS), last_ids, count)
+    except ValueError:
+        return jsonify({'error': 'Invalid count'}), 400
+    except ResponseError:
+        return jsonify({'error': 'Invalid stream ID'}), 400
+    except RedisError as e:
+        return jsonify({'error': f'Redis unavailable: {e}'}), 503
+    return jsonify({'operations': operations, 'last_ids': last_ids})
+
+
+@app.route('/api/history/<name>')
+def get_history(name):
+    """History of one series: ?seconds=86400 picks the finest resolution that covers it,
+    ?resolution=raw|1m|10m|1h forces one"""
+    if name not in SERIES:
+        return jsonify({'error': f'Unknown series {name}'}), 404
+    resolution = request.args.get('resolution')
+    if resolution is not None and resolution not in RESOLUTIONS:
+        return jsonify({'error': f'Unknown resolution {resolution}'}), 400
+    try:
+        seconds = float(request.args.get('seconds', 0)) or None
+    except ValueError:
+        return jsonify({'error': 'Invalid seconds'}), 400
+    series = data_collector.history[name]
+    resolution = resolution or (series.resolution_for(seconds) if seconds else 'raw')
+    return jsonify({'series': name, 'resolution': resolution,
+                    'points': series.points(seconds, resolution)})
+
+
+@app.route('/metrics')
+def metrics():
+    return metrics_payload(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
 
 
 @app.route('/api/operation_counts')
@@ -449,12 +644,17 @@ def get_operation_counts():
         return jsonify({'error': 'No simulation data available'})
 
 
-if __name__ == '__main__':
+def start_collector():
     # Start data collection in background
     thread = threading.Thread(target=data_collector.collect_operation_data)
     thread.daemon = True
     thread.start()
 
+
+if __name__ == '__main__':
     print("Starting dashboard on http://localhost:5005")
     print("Make sure your calculator services are running on ports 5001-5004")
-    app.run(host='0.0.0.0', port=5005, debug=True)
\ No newline at end of file
+    # Single worker: the collected metrics live in this process's memory.
+    # Every open /api/stream holds one thread, hence the larger thread count.
+    run(app, port=5005, workers=1, threads=int(os.getenv('DASHBOARD_THREADS', 64)),
+        on_worker_start=start_collector)
\ No newline at end of file
@@ -0,0 +1,203 @@
+"""Fixed-memory history for the dashboard time series.
+
+Every series keeps a raw ring plus rollups at 1 minute, 10 minutes and
+1 hour, each holding (time, min, max, avg) per bucket. Rings are flat arrays
+of float64 that are overwritten in place, so appending a point allocates
+nothing. With a directory, each ring lives in a memory-mapped file and the
+history survives a restart of the dashboard.
+"""
+import mmap
+import os
+from array import array
+
+# Resolution name -> (bucket seconds, capacity). 0 seconds keeps raw points.
+RESOLUTIONS = {
+    'raw': (0, 1200),
+    '1m': (60, 1440),
+    '10m': (600, 1008),
+    '1h': (3600, 720)
+}
+
+# Header slots, stored as float64 in front of the data
+HEAD, SIZE, CAPACITY, BUCKET, BUCKET_MIN, BUCKET_MAX, BUCKET_SUM, BUCKET_COUNT = range(8)
+HEADER_SIZE = 8
+
+
+class Ring:
+    """Circular buffer of ``capacity`` records of ``width`` floats.
+
+    The header also holds the bucket being accumulated by a rollup, so an
+    unfinished minute is not lost across a restart either.
+    """
+
+    def __init__(self, capacity, width, path=None):
+        self.capacity = capacity
+        self.width = width
+        length = HEADER_SIZE + capacity * width
+        self.file = None
+        if path is None:
+            self.mmap = None
+            self.buffer = memoryview(array('d', bytes(8 * length)))
+            self.view = self.buffer
+        else:
+            self.mmap = self._open(path, length)
+            self.buffer = memoryview(self.mmap)
+            self.view = self.buffer.cast('d')
+        if self.view[CAPACITY] != capacity:
+            # New or incompatible file: start empty
+            self.view[:HEADER_SIZE] = array('d', bytes(8 * HEADER_SIZE))
+            self.view[CAPACITY] = capacity
+        self.data = self.view[HEADER_SIZE:]
+
+    def _open(self, path, length):
+        self.file = open(path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size != 8 * length:
+            self.file.truncate(0)
+            self.file.truncate(8 * length)
+        return mmap.mmap(self.file.fileno(), 8 * length)
+
+    def __len__(self):
+        return int(self.view[SIZE])
+
+    def append(self, *record):
+        head = int(self.view[HEAD])
+        start = head * self.width
+        for offset, value in enumerate(record):
+            self.data[start + offset] = value
+        self.view[HEAD] = (head + 1) % self.capacity
+        if self.view[SIZE] < self.capacity:
+            self.view[SIZE] += 1
+
+    def records(self, since=None, last=None):
+        """Records oldest first, as tuples; only the ``last`` newest and those with time >= ``since``"""
+        size = len(self) if last is None else min(len(self), last)
+        first = (int(self.view[HEAD]) - size) % self.capacity
+        width = self.width
+        result = []
+        for i in range(size):
+            start = (first + i) % self.capacity * width
+            if since is None or self.data[start] >= since:
+                result.append(tuple(self.data[start:start + width]))
+        return result
+
+    def last(self):
+        if not len(self):
+            return None
+        start = (int(self.view[HEAD]) - 1) % self.capacity * self.width
+        return tuple(self.data[start:start + self.width])
+
+    def flush(self):
+        if self.mmap is not None:
+            self.mmap.flush()
+
+    def close(self):
+        if self.mmap is not None:
+            # Every view of the map must be released before it can be closed
+            self.data.release()
+            self.view.release()
+            self.buffer.release()
+            self.mmap.close()
+            self.file.close()
+            self.mmap = None
+
+
+class Series:
+    """One metric at every resolution of RESOLUTIONS, appended every ``interval`` seconds"""
+
+    def __init__(self, name, interval, directory=None, resolutions=RESOLUTIONS):
+        self.interval = interval
+        self.resolutions = resolutions
+        self.rings = {}
+        for resolution, (seconds, capacity) in resolutions.items():
+            path = os.path.join(directory, f'{name}.{resolution}.ring') if directory else None
+            self.rings[resolution] = Ring(capacity, 2 if seconds == 0 else 4, path)
+
+    def append(self, timestamp, value):
+        for resolution, (seconds, _) in self.resolutions.items():
+            ring = self.rings[resolution]
+            if seconds == 0:
+                ring.append(timestamp, value)
+                continue
+            header = ring.view
+            bucket = timestamp - timestamp % seconds
+            if header[BUCKET_COUNT] and bucket != header[BUCKET]:
+                ring.append(header[BUCKET], header[BUCKET_MIN], header[BUCKET_MAX],
+                            header[BUCKET_SUM] / header[BUCKET_COUNT])
+                header[BUCKET_COUNT] = 0
+            if not header[BUCKET_COUNT]:
+                header[BUCKET] = bucket
+                header[BUCKET_MIN] = header[BUCKET_MAX] = value
+                header[BUCKET_SUM] = 0.0
+            header[BUCKET_MIN] = min(header[BUCKET_MIN], value)
+            header[BUCKET_MAX] = max(header[BUCKET_MAX], value)
+            header[BUCKET_SUM] += value
+            header[BUCKET_COUNT] += 1
+
+    def last(self):
+        record = self.rings['raw'].last()
+        return record[1] if record else None
+
+    def tail(self, count):
+        """The ``count`` newest raw (time, value) points"""
+        return self.rings['raw'].records(last=count)
+
+    def resolution_for(self, seconds):
+        """Finest resolution whose ring still reaches ``seconds`` back"""
+        for resolution, (bucket, capacity) in self.resolutions.items():
+            if seconds <= capacity * (bucket or self.interval):
+                return resolution
+        return resolution
+
+    def points(self, seconds=None, resolution=None, now=None):
+        """Points of the last ``seconds``, as dicts with time and value (raw) or min/max/avg.
+
+        The resolution defaults to the finest one that covers the range. The
+        bucket still being accumulated is included as the last rollup point.
+        """
+        raw = self.rings['raw'].last()
+        if now is None:
+            now = raw[0] if raw else 0.0
+        if resolution is None:
+            resolution = self.resolution_for(seconds) if seconds else 'raw'
+        since = now - seconds if seconds else None
+        ring = self.rings[resolution]
+        if ring.width == 2:
+            return [{'time': t, 'value': v} for t, v in ring.records(since)]
+
+        points = [{'time': t, 'min': lo, 'max': hi, 'avg': avg} for t, lo, hi, avg in ring.records(since)]
+        header = ring.view
+        if header[BUCKET_COUNT]:
+            points.append({'time': header[BUCKET], 'min': header[BUCKET_MIN], 'max': header[BUCKET_MAX],
+                           'avg': header[BUCKET_SUM] / header[BUCKET_COUNT]})
+        return points
+
+    def flush(self):
+        for ring in self.rings.values():
+            ring.flush()
+
+    def close(self):
+        for ring in self.rings.values():
+            ring.close()
+
+
+class TimeSeriesStore:
+    """Named series sharing one optional backing directory"""
+
+    def __init__(self, names, interval, directory=None):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.series = {name: Series(name, interval, directory) for name in names}
+
+    def __getitem__(self, name):
+        return self.series[name]
+
+    def append(self, name, timestamp, value):
+        self.series[name].append(timestamp, value)
+
+    def flush(self):
+        for series in self.series.values():
+            series.flush()
+
+    def close(self):
+        for series in self.series.values():
+            series.close()